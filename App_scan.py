@@ -1,35 +1,59 @@
-from calendar_reader import CalendarReader, draw_box
+from calendar_reader import CalendarReader
 from google_auth import GoogleAuth
+from tile_viewer import TileViewer
+from scan_service import ScanClient
 from tkinter import filedialog, Label, Entry, Button, Checkbutton, IntVar, Frame, Tk, LEFT, StringVar
-from tkinter.ttk import Combobox
-from PIL import ImageTk, Image, ImageDraw
+from tkinter.ttk import Combobox, Treeview, Scrollbar
+from PIL import ImageTk, Image
 import numpy as np
 
 
-def draw_image(img, events_array):
-    plot = img.copy()
-    draw = ImageDraw.Draw(plot)
-    for i in range(len(events_array)):
-        b = events_array[i].box
-        draw_box(draw, b.to_draw(), events_array[i].flag)
-    return plot
+def read_planning(file_path, client=None):
+    """
+    Reads a planning, in the scan service when client is given.
+
+    Returns:
+    - (events, image of the page, upright as the event boxes)
+    """
+    # keep_image: the page is displayed; everything else the reader holds is released when it is closed
+    with CalendarReader(file_path, keep_image=True) as reader:
+        reader.load_image()
+        reader.get_separators()  # May deskew the page, as the scan does
+        if client is not None:
+            events_array = client.scan(file_path)
+        else:
+            events_array = reader.get_events()
+        return events_array, reader.image
 
 
-def display_image(img, events_array, img_label):
-    plot = draw_image(img, events_array)
-    img_small = plot.resize((800, 600))
-    img_tk = ImageTk.PhotoImage(img_small)
-    img_label.config(image=img_tk)
-    img_label.image = img_tk  # Keep a reference to avoid garbage collection
+WEEKDAYS = ["Lundi", "Mardi", "Mercredi", "Jeudi", "Vendredi", "Samedi", "Dimanche"]
+ALL_DAYS = "Tous les jours"
 
 
-def update_img_tk(img, img_label, p, i):
-    val = p[i].flag
-    if val == 1:
-        p[i].flag = 0
-    else:
-        p[i].flag = 1
-    display_image(img, p, img_label)
+def event_row(e):
+    """Values of an event in the event list."""
+    return ("☑" if e.flag else "☐", f"{WEEKDAYS[e.weekday()]} {e.day}", f"{e.beg} - {e.end}", e.name)
+
+
+def fill_event_list(tree, events_array, day_filter=ALL_DAYS):
+    """
+    Fills the event list with the events of the selected day.
+    Rows are Treeview items, not widgets, so the list opens as fast with a month of events as with a week.
+    The item id of a row is the index of its event in events_array.
+    """
+    tree.delete(*tree.get_children())
+    for i, e in enumerate(events_array):
+        if day_filter == ALL_DAYS or e.day == day_filter.split(" ")[-1]:
+            tree.insert("", "end", iid=str(i), values=event_row(e))
+
+
+def toggle_rows(tree, events_array, rows, viewer):
+    """Toggles the events of the given rows, then updates their boxes on the page."""
+    for iid in rows:
+        e = events_array[int(iid)]
+        e.flag = 0 if e.flag == 1 else 1
+        tree.item(iid, values=event_row(e))
+    viewer.refresh_events()
 
 
 def edit_error_event(event, label, error_win):
@@ -121,7 +145,7 @@ def new_text_entry(root, text, default):
     return entry
 
 
-def edit_window(event, checkbox):
+def edit_window(event, on_save):
     win = Tk()
     win.title('Edit')
     win.geometry('500x500')
@@ -136,20 +160,21 @@ def edit_window(event, checkbox):
         event.beg = beg_entry.get()
         event.end = end_entry.get()
         event.day = day_entry.get()
-        checkbox.config(text=event.name)
+        on_save()
         win.destroy()
 
     save_button = Button(win, text="Save", command=save_changes)
     save_button.pack()
 
 
-def check_all(events_array, list_var, val, img, img_label):
+def check_all(tree, events_array, val, viewer):
+    """Sets the flag of all the events shown in the list (the filtered day, or all days)."""
     assert val == 0 or val == 1
-    for var in list_var:
-        var.set(val)
-    for e in events_array:
+    for iid in tree.get_children():
+        e = events_array[int(iid)]
         e.flag = val
-    display_image(img, events_array, img_label)
+        tree.item(iid, values=event_row(e))
+    viewer.refresh_events()
 
 
 def app_scan(win):
@@ -157,9 +182,16 @@ def app_scan(win):
     for widget in win.winfo_children():
         widget.destroy()
 
-    # Initialize GoogleAuth and set up connection
-    auth = GoogleAuth()
-    auth.setup()
+    # Use the local scan service if it is running (warm OCR workers and Google client), else work in-process.
+    # Another user than the owner of the service only scans in it, and exports with their own account.
+    client = ScanClient()
+    use_service = client.available()
+    if use_service and not client.shared:
+        auth = client
+    else:
+        # Initialize GoogleAuth and set up connection
+        auth = GoogleAuth()
+        auth.setup()
     calendars = auth.get_calendars()
 
     if calendars is None or len(calendars) == 0:
@@ -201,58 +233,76 @@ def app_scan(win):
     cal_combo.pack(side=LEFT, padx=5)
 
     # Use CalendarReader to process the file
-    reader = CalendarReader(file_path)
-    img = reader.load_image()
-    reader.get_separators()
-    events_array = reader.get_events()
+    events_array, img = read_planning(file_path, client if use_service else None)
+
+    # Sort events chronologically by day and start time
+    events_array = sorted(events_array, key=lambda e: (e.day, e.beg))
+    events_array = np.array(events_array)
 
-    # Middle section: Checkboxes for events
+    # Middle section: list of events
     checkbox_frame = Frame(main_frame, bg="white", relief="groove", bd=1)
     checkbox_frame.pack(fill="x", pady=(0, 10))
 
-    # Header with "Select All" checkbox
+    # Header with "Select All" checkbox and day filter
     header_frame = Frame(checkbox_frame, bg="#f0f0f0")
     header_frame.pack(fill="x", pady=(0, 5))
 
     check_all_val = IntVar(value=1, name="check_all")
 
-    # Placeholder for img_label (needed for check_all command)
-    img_label = Label(main_frame, bg="white")
-
     check_all_button = Checkbutton(header_frame,
                                    variable=check_all_val,
                                    text="Tout sélectionner",
                                    onvalue=1, offvalue=0,
-                                   command=lambda: check_all(events_array, list_var_check, check_all_val.get(), img, img_label),
+                                   command=lambda: check_all(event_list, events_array, check_all_val.get(), viewer),
                                    bg="#f0f0f0",
                                    font=("Segoe UI", 9, "bold"))
-    check_all_button.pack(pady=5, padx=10, anchor="w")
-
-    # Weekday columns container
-    weekdays_container = Frame(checkbox_frame, bg="white")
-    weekdays_container.pack(fill="x", padx=10, pady=(0, 10))
-
-    weekdays = ["Lundi", "Mardi", "Mercredi", "Jeudi", "Vendredi"]
-
-    week_frames = []
-    for i in range(5):
-        col_frame = Frame(weekdays_container, bg="white", relief="flat", bd=0)
-        col_frame.grid(row=0, column=i, padx=8, pady=5, sticky="n")
-
-        # Day header label with underline effect
-        day_label = Label(col_frame, text=weekdays[i], bg="white",
-                          font=("Segoe UI", 10, "bold"), fg="#333333")
-        day_label.grid(row=0, column=0, columnspan=2, pady=(0, 5), sticky="w")
-
-        # Separator line under day name
-        sep = Frame(col_frame, bg="#cccccc", height=1)
-        sep.grid(row=1, column=0, columnspan=2, sticky="ew", pady=(0, 5))
-
-        week_frames.append(col_frame)
-
-    # Configure weekdays container columns to distribute evenly
-    for i in range(5):
-        weekdays_container.grid_columnconfigure(i, weight=1)
+    check_all_button.pack(side=LEFT, pady=5, padx=10)
+
+    day_var = StringVar(value=ALL_DAYS)
+    day_combo = Combobox(header_frame, textvariable=day_var, state="readonly", width=25,
+                         values=[ALL_DAYS] + [f"{WEEKDAYS[e.weekday()]} {e.day}" for e in
+                                              {e.day: e for e in events_array}.values()])
+    day_combo.pack(side=LEFT, padx=10)
+    day_combo.bind("<<ComboboxSelected>>", lambda _: fill_event_list(event_list, events_array, day_var.get()))
+
+    Label(header_frame, text="Clic sur ☐ ou Espace : (dé)sélectionner, double-clic : modifier",
+          bg="#f0f0f0", fg="#666666", font=("Segoe UI", 8)).pack(side=LEFT, padx=10)
+
+    list_frame = Frame(checkbox_frame, bg="white")
+    list_frame.pack(fill="x", padx=10, pady=(0, 10))
+
+    event_list = Treeview(list_frame, columns=("check", "day", "time", "name"), show="headings", height=12)
+    for col, title, width in (("check", "", 40), ("day", "Jour", 180), ("time", "Horaire", 120), ("name", "Événement", 600)):
+        event_list.heading(col, text=title)
+        event_list.column(col, width=width, stretch=(col == "name"), anchor="w")
+    scrollbar = Scrollbar(list_frame, orient="vertical", command=event_list.yview)
+    event_list.configure(yscrollcommand=scrollbar.set)
+    event_list.pack(side=LEFT, fill="x", expand=True)
+    scrollbar.pack(side=LEFT, fill="y")
+
+    def on_click(tk_event):
+        row = event_list.identify_row(tk_event.y)
+        if row and event_list.identify_column(tk_event.x) == "#1":
+            toggle_rows(event_list, events_array, [row], viewer)
+
+    def on_double_click(tk_event):
+        row = event_list.identify_row(tk_event.y)
+        if row and event_list.identify_column(tk_event.x) != "#1":
+            e = events_array[int(row)]
+
+            def on_save():
+                event_list.item(row, values=event_row(e))
+                viewer.refresh_events()  # Redraw the overlay of the edited event
+
+            edit_window(e, on_save)
+
+    event_list.bind("<<TreeviewSelect>>",
+                    lambda _: viewer.highlight([events_array[int(row)] for row in event_list.selection()]))
+    event_list.bind("<Button-1>", on_click)
+    event_list.bind("<Double-1>", on_double_click)
+    event_list.bind("<space>", lambda _: toggle_rows(event_list, events_array, event_list.selection(), viewer))
+
+    fill_event_list(event_list, events_array)
 
     # Action button at the bottom (pack first with side=BOTTOM to ensure visibility)
     button_frame = Frame(main_frame, bg="white")
@@ -262,43 +312,11 @@ def app_scan(win):
     img_frame = Frame(main_frame, bg="white", relief="groove", bd=1)
     img_frame.pack(fill="both", expand=True, pady=(0, 10))
 
-    img_label.master = img_frame
-    img_label.pack(pady=10, padx=10)
-
-    display_image(img, events_array, img_label)
-
-    # Sort events chronologically by day and start time
-    events_array = sorted(events_array, key=lambda e: (e.day, e.beg))
-    events_array = np.array(events_array)
-
-    list_var_check = [IntVar(value=e.flag) for e in events_array]
-    list_case = []
-
-    count = [0] * 7
-    for i, e in enumerate(events_array):
-        count[e.weekday()] += 1
-        # Offset by 2 to account for header label and separator
-        row_num = count[e.weekday()] + 1
-
-        button = Checkbutton(week_frames[e.weekday()], text=e.name,
-                             variable=list_var_check[i],
-                             onvalue=1,
-                             offvalue=0,
-                             command=lambda i=i: update_img_tk(img, img_label, events_array, i),
-                             bg="white",
-                             font=("Segoe UI", 9),
-                             anchor="w")
-        button.grid(row=row_num, column=0, pady=1, sticky="w")
-        list_case.append(button)
-
-        edit_button = Button(week_frames[e.weekday()],
-                             text="✏️",
-                             command=lambda i=i: edit_window(events_array[i], list_case[i]),
-                             font=("Segoe UI", 8),
-                             width=2,
-                             relief="flat",
-                             bg="#e0e0e0")
-        edit_button.grid(row=row_num, column=1, pady=1, padx=(2, 0), sticky="w")
+    # Zoomable view of the page: wheel to zoom, drag to pan
+    viewer = TileViewer(img_frame, img, bg="white")
+    viewer.pack(fill="both", expand=True, pady=10, padx=10)
+    viewer.set_events(events_array)
+    del img  # The viewer holds the page from now on
 
     def get_selected_calendar_id():
         return calendar_ids.get(calendar_var.get())
@@ -0,0 +1,88 @@
+"""
+Memory benchmark: reads the same planning many times in one process and reports the resident memory (RSS).
+
+    python bench_memory.py tests/test.pdf --documents 500
+    python bench_memory.py tests/test.pdf --stage render --keep-readers
+
+With the readers closed after each document, the RSS must stay flat once the first documents have
+warmed the allocators and the OCR models. --keep-readers keeps every reader alive without closing it,
+as the interface used to: with --stage render, no page is ever released. --stage render skips OCR
+(no Tesseract needed).
+"""
+
+import os
+import gc
+import time
+import argparse
+
+from calendar_reader import CalendarReader
+from profiling import Profiler
+
+
+def rss() -> int:
+    """Resident memory of the process, in bytes (psutil if installed, else /proc on Linux)."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def bench(file_path: str, documents: int = 500, stage: str = "full", keep_readers: bool = False,
+          every: int = 50, ocr_backend: str | None = None) -> list:
+    """
+    Reads file_path documents times, as many documents in a row.
+
+    Parameters:
+    - stage: "full" (process and get_events) or "render" (load_image and get_separators only)
+    - keep_readers: keep every reader, not closed
+    - every: RSS sample interval, in documents
+
+    Returns:
+    - List of (documents read, RSS in bytes)
+    """
+    kept = []
+    samples = [(0, rss())]
+    start = time.perf_counter()
+    for n in range(1, documents + 1):
+        reader = CalendarReader(file_path, profiler=Profiler(enabled=False), ocr_backend=ocr_backend)
+        if stage == "render":
+            reader.load_image()
+            reader.get_separators()
+        else:
+            reader.process()
+            reader.get_events()
+        if keep_readers:
+            kept.append(reader)
+        else:
+            reader.close()
+        del reader
+
+        if n % every == 0 or n == documents:
+            gc.collect()
+            samples.append((n, rss()))
+            print(f"{n:>5} documents  {samples[-1][1] / 2 ** 20:8.1f} MB  {(time.perf_counter() - start) / n:.3f} s/doc")
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesure de la mémoire sur de nombreux documents lus à la suite.")
+    parser.add_argument("file", help="Planning lu à chaque document")
+    parser.add_argument("--documents", type=int, default=500)
+    parser.add_argument("--stage", choices=["full", "render"], default="full")
+    parser.add_argument("--keep-readers", action="store_true", help="Garder les lecteurs sans les fermer")
+    parser.add_argument("--every", type=int, default=50)
+    parser.add_argument("--ocr-backend", default=None, help="tesserocr, pytesseract ou auto")
+    args = parser.parse_args()
+
+    samples = bench(args.file, args.documents, args.stage, args.keep_readers, args.every, args.ocr_backend)
+    # Growth after warm-up: from the first sample past 10 % of the documents to the last one
+    warm = next(s for s in samples if s[0] >= args.documents / 10)
+    growth = (samples[-1][1] - warm[1]) / 2 ** 20
+    per_100 = 100 * growth / max(1, samples[-1][0] - warm[0])
+    print(f"Croissance après les {warm[0]} premiers documents : {growth:+.1f} MB ({per_100:+.2f} MB / 100 documents)")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,18 +2,128 @@
 CalendarReader class for reading and parsing calendar PDFs/images.
 """
 
+import os
 import re
+import ctypes
+import configparser
+import unicodedata
+from datetime import date
 import numpy as np
 import fitz  # PyMuPDF for PDF processing
 from PIL import Image
-import pytesseract
 
 from event import event
 from box import box
+from grid import grid, ruling_runs
+from profiling import Profiler, profiler as default_profiler
+from ocr_backend import OcrBackend, get_backend, get_profile
 
 
 MONTHS = ["janvier", "fevrier", "mars", "avril", "mai", "juin", "juillet", "aout", "septembre", "octobre", "novembre", "decembre"]
 
+DATE_PATTERN = re.compile(
+    r'\b(\d{1,2})\s+(janvier|f[ée]vrier|mars|avril|mai|juin|juillet|ao[uû]t|septembre|octobre|novembre|d[ée]cembre)\b',
+    re.IGNORECASE
+)
+TIME_PATTERN = re.compile(r'\d{2}:\d{2} - \d{2}:\d{2}')
+# Anything that looks like a time, to spot misread time ranges
+TIME_HINT_PATTERN = re.compile(r'\d{1,2}\s?[:hH.]\s?\d{2}')
+FULL_DATE_PATTERN = re.compile(r'\b(\d{1,2})/(\d{1,2})/(\d{4})\b')
+WEEKDAY_PATTERN = re.compile(r'\b(lundi|mardi|mercredi|jeudi|vendredi|samedi|dimanche)\b', re.IGNORECASE)
+
+# OCR profile (see ocr_backend.OCR_PROFILES) used by each stage of the pipeline
+OCR_STAGE_PROFILES = {
+    "page": "full_page",        # extract_text: whole page
+    "regions": "event_cells",   # extract_text_regions: one table cell
+    "reocr": "event_cells",     # _reocr_weak_boxes: one event box at a higher resolution
+    "headers": "headers",       # _reread_headers: one day header whose date was not read
+}
+
+
+# Settings tuned for one planning layout (see tuner.py). The thresholds are in pixels at ocr_dpi.
+DEFAULT_LAYOUT = {
+    "ocr_dpi": 300,
+    "page_profile": OCR_STAGE_PROFILES["page"],
+    "line_x_threshold": 300,    # _group_lines
+    "line_y_threshold": 50,
+    "box_x_threshold": 150,     # _group_boxes
+    "box_y_threshold": 75,
+}
+LAYOUTS_PATH = os.path.join(os.path.dirname(__file__), "layouts.ini")
+
+
+def load_layout_profile(name: str, path: str | None = None) -> dict:
+    """
+    Reads a named layout profile from layouts.ini (one section per layout, keys of DEFAULT_LAYOUT).
+    Missing keys take their default value.
+    """
+    config = configparser.ConfigParser()
+    config.read(path or LAYOUTS_PATH, encoding="utf-8")
+    if not config.has_section(name):
+        raise KeyError(f"Unknown layout profile {name!r} in {path or LAYOUTS_PATH}")
+    layout = dict(DEFAULT_LAYOUT)
+    for key, default in DEFAULT_LAYOUT.items():
+        if key in config[name]:
+            layout[key] = type(default)(config[name][key])
+    return layout
+
+
+def save_layout_profile(name: str, layout: dict, path: str | None = None):
+    """Writes a layout profile in layouts.ini, keeping the other profiles."""
+    path = path or LAYOUTS_PATH
+    config = configparser.ConfigParser()
+    config.read(path, encoding="utf-8")
+    config[name] = {key: str(layout[key]) for key in DEFAULT_LAYOUT if key in layout}
+    with open(path, "w", encoding="utf-8") as f:
+        config.write(f)
+
+
+# Long side of an A4 page in inches: photos are reduced to the size of an A4 page rendered at the OCR dpi
+A4_LONG_SIDE = 297 / 25.4
+
+# Transposition undoing each EXIF orientation (see ImageOps.exif_transpose)
+EXIF_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT, 3: Image.Transpose.ROTATE_180, 4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE, 6: Image.Transpose.ROTATE_270, 7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90
+}
+
+
+def load_photo(file_path: str, max_side: int) -> np.ndarray:
+    """
+    Loads a photo or image as a grayscale array whose long side is at most max_side pixels, upright.
+    JPEG files are decoded directly in grayscale at 1/2, 1/4 or 1/8 of their size (Image.draft):
+    the full resolution color image is never held in memory. The integer reductions leave the image
+    up to twice max_side; it is then resized to max_side. The EXIF orientation is applied to the reduced image.
+    """
+    img = Image.open(file_path)
+    orientation = img.getexif().get(0x0112, 1)
+
+    scale = max(img.size) / max_side
+    if img.format == "JPEG":
+        img.draft("L", (int(img.width / scale), int(img.height / scale)) if scale > 1 else img.size)
+    img.load()
+    factor = int(max(img.size) / max_side)
+    if factor >= 2:
+        img = img.reduce(factor)
+    if img.mode != "L":
+        img = img.convert("L")
+    if max(img.size) > max_side:
+        img.thumbnail((max_side, max_side), Image.BILINEAR)
+    if orientation in EXIF_TRANSPOSE:
+        img = img.transpose(EXIF_TRANSPOSE[orientation])
+    return np.asarray(img)
+
+
+def pixmap_array(pix) -> np.ndarray:
+    """
+    Wraps the samples of a single-channel pixmap as a (height, width) uint8 array, without copy.
+    The array keeps the pixmap alive.
+    """
+    buf = (ctypes.c_ubyte * (pix.stride * pix.height)).from_address(pix.samples_ptr)
+    buf._pixmap = pix
+    return np.frombuffer(buf, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+
 
 class CalendarReader:
     """
@@ -21,95 +131,360 @@ class CalendarReader:
     Extracts events with their times and dates.
     """
 
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, year: int | None = None, profiler: Profiler | None = None,
+                 ocr_backend: OcrBackend | str | None = None, page: int = 0, rectify: bool = False,
+                 ocr_profiles: dict | None = None, layout: str | dict | None = None, keep_image: bool = False):
         """
         Initialize CalendarReader with a file path.
 
         Parameters:
         - file_path: Path to the PDF or image file
+        - page: Page number to read, for PDF files
+        - year: Year of the planning. If None, it is inferred from the dates written on the page.
+        - profiler: Profiler recording the stages. If None, uses the shared profiler (see profiling.py).
+        - ocr_backend: OcrBackend instance or name (see ocr_backend.get_backend). If None, the default backend.
+        - rectify: for png/jpg photos, correct the perspective before reading (see image_process.rectify, needs OpenCV)
+        - ocr_profiles: OCR profile per stage, overriding OCR_STAGE_PROFILES, e.g. {"page": "event_cells"}
+        - layout: name of a profile of layouts.ini (see tuner.py), or dict overriding DEFAULT_LAYOUT
+        - keep_image: keep self.image after the text is grouped, e.g. to display it. By default the page pixels
+          are released once they are no longer needed.
+
+        The PDF document is closed once the page is read. Use the reader as a context manager, or call close(),
+        to also release the page when the reading stops early.
         """
         self.file_path = file_path
+        self.page = page
+        self.year = year
+        self.profiler = profiler if profiler is not None else default_profiler
+        if ocr_backend is None or isinstance(ocr_backend, str):
+            ocr_backend = get_backend(ocr_backend)
+        self.ocr_backend = ocr_backend
+        if isinstance(layout, str):
+            layout = load_layout_profile(layout)
+        self.layout = {**DEFAULT_LAYOUT, **(layout or {})}
+        self.ocr_profiles = {**OCR_STAGE_PROFILES, "page": self.layout["page_profile"], **(ocr_profiles or {})}
+        self.rectify = rectify
+        self.keep_image = keep_image
+        self.homography = None
         self.image = None
+        self.pixels = None
+        self.ocr_dpi = None
+        self.layout_pixels = None
+        self._doc = None
         self.ocr_data = None
         self.lines = None
         self.columns = None
+        self.segments = None
+        self.skew_angle = 0.0
+        self.token_index = None
+        self.grid = None
         self.events = None
 
-    def load_image(self, dpi: int = 300) -> Image.Image:
+    def close(self):
+        """
+        Closes the PDF document and releases the page pixels and the intermediate results.
+        The OCR boxes (ocr_data) and the events are kept.
+        """
+        self._close_document()
+        self.image = None
+        self.pixels = None
+        self.layout_pixels = None
+        self.segments = None
+        self.token_index = None
+        self.grid = None
+
+    def _close_document(self):
+        """
+        Closes the PDF document and empties MuPDF's resource store: it keeps the decoded resources of closed
+        documents until it reaches 256 MB, which a session reading many plannings would otherwise always hold.
         """
-        Converts a PDF page to a high-resolution image or loads an image file.
+        if self._doc is not None:
+            self._doc.close()
+            self._doc = None
+            fitz.TOOLS.store_shrink(100)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def _release_page(self):
+        """Called once the text is grouped: nothing is rendered or read from the page after that."""
+        self._close_document()
+        self.layout_pixels = None
+        if not self.keep_image:
+            self.image = None
+            self.pixels = None
+
+    def load_image(self, dpi: int | None = None) -> Image.Image:
+        """
+        Converts a PDF page to a high-resolution grayscale image or loads an image file.
+        self.pixels is a uint8 array sharing its buffer with self.image.
 
         Parameters:
-        - dpi: Resolution for PDF conversion
+        - dpi: Resolution for PDF conversion. Larger photos are reduced to an A4 page at that resolution (see load_photo).
+          If None, the one of the layout profile, whose thresholds are in pixels at that resolution.
 
         Returns:
-        - PIL Image object
+        - PIL Image object (mode "L")
         """
+        dpi = dpi or self.layout["ocr_dpi"]
         ext = self.file_path[-3:].lower()
 
-        if ext in ("png", "jpg"):
-            self.image = Image.open(self.file_path)
-        elif ext == "pdf":
-            doc = fitz.open(self.file_path)
-            page = doc[0]
-            pix = page.get_pixmap(matrix=fitz.Matrix(dpi / 72, dpi / 72))
-            size = [pix.width, pix.height]
-            self.image = Image.frombytes("RGB", size, pix.samples)
-        else:
-            raise FileNotFoundError("File format not supported")
+        with self.profiler.stage("load_image", dpi=dpi) as stage:
+            if ext in ("png", "jpg"):
+                self.pixels = load_photo(self.file_path, int(A4_LONG_SIDE * dpi))
+                self.ocr_dpi = None
+                if self.rectify:
+                    self._rectify_pixels()
+            elif ext == "pdf":
+                self.pixels = self._render(dpi)
+                self.ocr_dpi = dpi
+            else:
+                raise FileNotFoundError("File format not supported")
+
+            self.image = Image.fromarray(self.pixels)
+            stage["pixels"] = self.pixels.size
 
         return self.image
 
+    def _rectify_pixels(self):
+        """Corrects the perspective of self.pixels when the page is found (see rectify min_score) and not fronto-parallel."""
+        from image_process import rectify  # OpenCV is only needed for photos
+
+        with self.profiler.stage("rectify", pixels=self.pixels.size) as stage:
+            self.pixels, self.homography, score = rectify(self.pixels)
+            stage["score"] = score
+            stage["warped"] = self.homography is not None
+
+    def _open_page(self):
+        """Opens the PDF document once and returns the page to read."""
+        if self._doc is None:
+            self._doc = fitz.open(self.file_path)
+        return self._doc[self.page]
+
+    def _render(self, dpi: int, clip=None) -> np.ndarray:
+        """
+        Renders the PDF page (or a clip of it, in points) as a grayscale pixmap.
+
+        Returns:
+        - uint8 array view on the pixmap samples
+        """
+        page = self._open_page()
+        pix = page.get_pixmap(matrix=fitz.Matrix(dpi / 72, dpi / 72), clip=clip,
+                              colorspace=fitz.csGRAY, alpha=False)
+        return pixmap_array(pix)
+
+    def load_layout(self, dpi: int = 75) -> np.ndarray:
+        """
+        Renders the PDF page at low resolution, only to locate the table layout.
+
+        Parameters:
+        - dpi: Resolution of the layout pass
+
+        Returns:
+        - Grayscale uint8 array
+        """
+        with self.profiler.stage("load_layout", dpi=dpi) as stage:
+            self.layout_pixels = self._render(dpi)
+            stage["pixels"] = self.layout_pixels.size
+        return self.layout_pixels
+
+    def _ocr(self, image: np.ndarray, stage: str) -> dict:
+        """Reads an image with the OCR profile of a pipeline stage, timed as "ocr:<profile>"."""
+        profile = get_profile(self.ocr_profiles[stage])
+        with self.profiler.stage(f"ocr:{profile.name}", file=self.file_path, page=self.page,
+                                 pixels=image.size) as s:
+            data = self.ocr_backend.read(image, profile)
+            s["tokens"] = len(data["text"])
+        return data
+
     def extract_text(self) -> dict:
         """
-        Extract text from image with pytesseract.
+        Extract text from image with the OCR backend.
 
         Returns:
-        - Dict with keys: left, top, width, height, text (only non-empty entries)
+        - Dict with keys: left, top, width, height, text, conf (only non-empty entries)
         """
         if self.image is None:
             self.load_image()
 
-        ocr_results = pytesseract.image_to_data(
-            self.image, lang="eng", output_type=pytesseract.Output.DICT
-        )
+        with self.profiler.stage("extract_text", pixels=self.image.width * self.image.height) as stage:
+            self.ocr_data = self._ocr(self.pixels, "page")
+            stage["tokens"] = len(self.ocr_data["text"])
 
-        # Filter to only non-empty text entries
-        valid_indices = [i for i, t in enumerate(ocr_results["text"]) if t.strip()]
+        return self.ocr_data
 
-        self.ocr_data = {
-            "left": [int(ocr_results["left"][i]) for i in valid_indices],
-            "top": [int(ocr_results["top"][i]) for i in valid_indices],
-            "width": [int(ocr_results["width"][i]) for i in valid_indices],
-            "height": [int(ocr_results["height"][i]) for i in valid_indices],
-            "text": [ocr_results["text"][i] for i in valid_indices]
-        }
+    def extract_text_regions(self, layout_dpi: int = 75, ocr_dpi: int = 300) -> dict:
+        """
+        Two-pass text extraction for PDF files.
+        The rulings and the non-empty cells are found on a low resolution render,
+        then only those cells are rendered at high resolution and read by the OCR backend.
+
+        Parameters:
+        - layout_dpi: Resolution of the layout pass
+        - ocr_dpi: Resolution of the OCR pass
+
+        Returns:
+        - Dict with keys: left, top, width, height, text, conf, in ocr_dpi pixels
+        """
+        layout = self.load_layout(layout_dpi)
+        lines, columns = self._find_separators(layout, ink_threshold=32)
+        regions = self._get_text_regions(layout, lines, columns)
+        self.layout_pixels = None
+
+        # Separators are scaled to the OCR resolution so that the grouping thresholds still apply
+        scale = ocr_dpi / layout_dpi
+        self.lines = np.round(lines * scale).astype(int)
+        self.columns = np.round(columns * scale).astype(int)
+
+        self.ocr_dpi = ocr_dpi
+        matrix = fitz.Matrix(ocr_dpi / 72, ocr_dpi / 72)
+        to_points = 72 / layout_dpi
+        self.ocr_data = {"left": [], "top": [], "width": [], "height": [], "text": [], "conf": []}
+        if len(ruling_runs(lines)) < 2 or len(ruling_runs(columns)) < 2:
+            return self.ocr_data  # No table: the cells would be the whole page, see process
+
+        with self.profiler.stage("extract_text_regions", regions=len(regions)) as stage:
+            pixels = 0
+            for x0, y0, x1, y1 in regions:
+                clip = fitz.Rect(x0 * to_points, y0 * to_points, x1 * to_points, y1 * to_points)
+                crop = self._render(ocr_dpi, clip=clip)
+                pixels += crop.size
+                data = self._ocr(crop, "regions")
+                # Position of the clip in the full page render at ocr_dpi
+                origin = (clip * matrix).irect
+                self.ocr_data["left"].extend(x + origin.x0 for x in data["left"])
+                self.ocr_data["top"].extend(y + origin.y0 for y in data["top"])
+                for key in ("width", "height", "text", "conf"):
+                    self.ocr_data[key].extend(data[key])
+            stage["pixels"] = pixels
+            stage["tokens"] = len(self.ocr_data["text"])
 
         return self.ocr_data
 
+    def _get_text_regions(self, pixels: np.ndarray, lines, columns, ink_threshold: int = 128, margin: int = 3) -> list:
+        """
+        Lists the cells delimited by the separators that contain some ink.
+
+        Parameters:
+        - pixels: low resolution grayscale render of the page
+        - lines, columns: separators found on that render
+        - ink_threshold: minimum darkness (0-255) of a pixel to count as ink
+        - margin: pixels kept around the ink of each cell
+
+        Returns:
+        - List of (x0, y0, x1, y1) regions, in pixels of the given image
+        """
+        height, width = pixels.shape
+
+        def bands(runs, size):
+            edges = [-1] + [e for r in runs for e in r] + [size]
+            # Cells lie between the end of a ruling and the start of the next one
+            return [(edges[k] + 1, edges[k + 1]) for k in range(0, len(edges), 2) if edges[k + 1] - edges[k] > 1]
+
+        regions = []
+        for y0, y1 in bands(ruling_runs(lines), height):
+            for x0, x1 in bands(ruling_runs(columns), width):
+                cell = pixels[y0:y1, x0:x1] < 255 - ink_threshold
+                if not cell.any():
+                    continue
+                # Shrink the cell to the bounding box of its ink, with a small margin
+                rows = np.where(cell.any(axis=1))[0]
+                cols = np.where(cell.any(axis=0))[0]
+                regions.append((
+                    int(max(x0, x0 + cols[0] - margin)),
+                    int(max(y0, y0 + rows[0] - margin)),
+                    int(min(x1, x0 + cols[-1] + 1 + margin)),
+                    int(min(y1, y0 + rows[-1] + 1 + margin))
+                ))
+        return regions
+
     def get_separators(self) -> tuple:
         """
         Identifies the horizontal and vertical separators in the image.
+        When the projections find less than two lines or columns (skewed scan, photo), the rulings are
+        searched with morphology instead (see _find_rulings), and the page is deskewed. Without OpenCV,
+        the separators of the projections are kept.
 
         Returns:
         - Tuple of (lines, columns) arrays
         """
-        if self.image is None:
+        if self.pixels is None:
             self.load_image()
 
-        img_array = np.array(self.image.convert("L"))
-        img_array = 255 - img_array  # Invert colors
+        with self.profiler.stage("get_separators", pixels=self.pixels.size) as stage:
+            self.lines, self.columns = self._find_separators(self.pixels)
+            stage["lines"] = len(self.lines)
+            stage["columns"] = len(self.columns)
 
-        vertical_sum = np.sum(img_array, axis=0)
-        horizontal_sum = np.sum(img_array, axis=1)
+        if len(ruling_runs(self.lines)) < 2 or len(ruling_runs(self.columns)) < 2:
+            try:
+                self._find_rulings()
+            except ImportError:
+                pass  # OpenCV not installed: keep the separators of the projections
 
-        critere_line = 255 * self.image.width / 2
-        critere_col = 255 * self.image.height / 3
+        return self.lines, self.columns
 
-        self.columns = np.where(vertical_sum > critere_col)[0]
-        self.lines = np.where(horizontal_sum > critere_line)[0]
+    def _find_rulings(self, max_skew: float = 0.2):
+        """
+        Finds the rulings with image_process.find_rulings, stored as line segments in self.segments.
+        A page skewed by more than max_skew degrees is rotated upright (self.pixels, self.image and
+        self.skew_angle updated), so that OCR boxes and rulings share axis-aligned coordinates.
+        """
+        from image_process import find_rulings, ruling_indices, deskew  # OpenCV is only needed here
+
+        with self.profiler.stage("find_rulings", pixels=self.pixels.size) as stage:
+            horizontal, vertical, angle = find_rulings(self.pixels)
+            if abs(angle) > max_skew and len(horizontal) + len(vertical) > 0:
+                self.pixels = deskew(self.pixels, angle)
+                self.image = Image.fromarray(self.pixels)
+                self.skew_angle = angle
+                # Positions are taken at the page center: the rotation only scales their offset
+                height, width = self.pixels.shape
+                cos = np.cos(np.radians(angle))
+                horizontal[:, 5] = height / 2 + (horizontal[:, 5] - height / 2) * cos
+                vertical[:, 5] = width / 2 + (vertical[:, 5] - width / 2) * cos
+                horizontal[:, 4] -= angle
+                vertical[:, 4] -= angle
+
+            self.segments = np.concatenate((horizontal, vertical))
+            self.lines = ruling_indices(horizontal, self.pixels.shape[0])
+            self.columns = ruling_indices(vertical, self.pixels.shape[1])
+            stage["lines"] = len(horizontal)
+            stage["columns"] = len(vertical)
+            stage["angle"] = angle
 
-        return self.lines, self.columns
+    @staticmethod
+    def _find_separators(pixels: np.ndarray, ink_threshold: int | None = None) -> tuple:
+        """
+        Returns the (lines, columns) separators of a grayscale image, at its own resolution.
+        Ink projections are computed from the white projections, without an inverted copy of the image.
+
+        Parameters:
+        - pixels: uint8 array (height, width), white background
+        - ink_threshold: if set, pixels darker than this (0-255, inverted) count as fully black.
+          At low resolution thin rulings are anti-aliased over two pixels and would not reach the criteria.
+        """
+        height, width = pixels.shape
+
+        if ink_threshold is not None:
+            ink = pixels < 255 - ink_threshold
+            vertical_sum = 255 * np.count_nonzero(ink, axis=0)
+            horizontal_sum = 255 * np.count_nonzero(ink, axis=1)
+        else:
+            vertical_sum = 255 * height - np.sum(pixels, axis=0, dtype=np.int64)
+            horizontal_sum = 255 * width - np.sum(pixels, axis=1, dtype=np.int64)
+
+        critere_line = 255 * width / 2
+        critere_col = 255 * height / 3
+
+        columns = np.where(vertical_sum > critere_col)[0]
+        lines = np.where(horizontal_sum > critere_line)[0]
+
+        return lines, columns
 
     @staticmethod
     def _within_columns(x1: int, x2: int, columns) -> bool:
@@ -123,7 +498,7 @@ class CalendarReader:
 
     @staticmethod
     def _combine_box(data: dict, i1: int, i2: int) -> tuple:
-        """Combines two boxes from ocr_data dict and returns a tuple of the combined values."""
+        """Combines two boxes from ocr_data dict and returns a tuple of the combined values (confidence is the lowest)."""
         x1, y1, w1, h1 = data["left"][i1], data["top"][i1], data["width"][i1], data["height"][i1]
         x2, y2, w2, h2 = data["left"][i2], data["top"][i2], data["width"][i2], data["height"][i2]
         text1, text2 = data["text"][i1], data["text"][i2]
@@ -133,7 +508,8 @@ class CalendarReader:
             min(y1, y2),
             max(x1 + w1, x2 + w2) - min(x1, x2),
             max(y1 + h1, y2 + h2) - min(y1, y2),
-            text1 + " " + text2
+            text1 + " " + text2,
+            min(data["conf"][i1], data["conf"][i2])
         )
 
     def _group_lines(self, data: dict, x_threshold: int = 300, y_threshold: int = 50) -> dict:
@@ -142,7 +518,7 @@ class CalendarReader:
         Text is read from left to right, top to bottom.
 
         Parameters:
-        - data: dict with keys left, top, width, height, text
+        - data: dict with keys left, top, width, height, text, conf
         - x_threshold: maximum horizontal distance between boxes to be combined
         - y_threshold: maximum vertical distance between boxes to be combined
 
@@ -167,10 +543,10 @@ class CalendarReader:
                     i -= 2
                     combined = True
                 else:
-                    results.append((data["left"][i], data["top"][i], data["width"][i], data["height"][i], data["text"][i]))
+                    results.append((data["left"][i], data["top"][i], data["width"][i], data["height"][i], data["text"][i], data["conf"][i]))
                     i -= 1
             if i == 0:
-                results.append((data["left"][0], data["top"][0], data["width"][0], data["height"][0], data["text"][0]))
+                results.append((data["left"][0], data["top"][0], data["width"][0], data["height"][0], data["text"][0], data["conf"][0]))
 
             results.reverse()
             data = {
@@ -178,7 +554,8 @@ class CalendarReader:
                 "top": [r[1] for r in results],
                 "width": [r[2] for r in results],
                 "height": [r[3] for r in results],
-                "text": [r[4] for r in results]
+                "text": [r[4] for r in results],
+                "conf": [r[5] for r in results]
             }
             n = len(data["text"])
 
@@ -189,7 +566,7 @@ class CalendarReader:
         Cleans the OCR data by combining text boxes that are close enough to form a single text area.
 
         Parameters:
-        - data: dict with keys left, top, width, height, text
+        - data: dict with keys left, top, width, height, text, conf
         - x_threshold: maximum horizontal distance between boxes to be combined
         - y_threshold: maximum vertical distance between boxes to be combined
 
@@ -205,6 +582,7 @@ class CalendarReader:
                 continue
             x1, y1, w1, h1 = data["left"][i], data["top"][i], data["width"][i], data["height"][i]
             text_parts = [data["text"][i]]
+            conf = data["conf"][i]
             combined_x1, combined_y1 = x1, y1
             combined_x2, combined_y2 = x1 + w1, y1 + h1
 
@@ -217,6 +595,7 @@ class CalendarReader:
                     self._within_columns(x1, x2, self.columns) and
                     self._within_columns(y1, y2, self.lines)):
                     text_parts.append(data["text"][j])
+                    conf = min(conf, data["conf"][j])
                     combined_x1 = min(combined_x1, x2)
                     combined_y1 = min(combined_y1, y2)
                     combined_x2 = max(combined_x2, x2 + w2)
@@ -228,7 +607,8 @@ class CalendarReader:
                 combined_y1,
                 combined_x2 - combined_x1,
                 combined_y2 - combined_y1,
-                " ".join(text_parts)
+                " ".join(text_parts),
+                conf
             ))
 
         return {
@@ -236,98 +616,381 @@ class CalendarReader:
             "top": [r[1] for r in results],
             "width": [r[2] for r in results],
             "height": [r[3] for r in results],
-            "text": [r[4] for r in results]
+            "text": [r[4] for r in results],
+            "conf": [r[5] for r in results]
         }
 
-    def process(self) -> dict:
+    def _group_cells(self, data: dict) -> dict:
+        """
+        Groups the words by table cell, using the grid built from the separators.
+        Words are bucketed by the label of the cell containing their center, so no distance threshold is involved.
+        Inside a cell, words are read line by line, and a new box starts at a line beginning
+        with a time range (a new event) or after a vertical gap taller than the line.
+        A box cut by a horizontal ruling (an event overlapping an hour line) is joined back
+        to the event ending the cell above when it does not start with a time range itself.
+
+        Parameters:
+        - data: dict with keys left, top, width, height, text, conf
+
+        Returns:
+        - Grouped data dict with same structure
+        """
+        n = len(data["text"])
+        if n == 0:
+            return data
+
+        left, top = np.array(data["left"]), np.array(data["top"])
+        width, height = np.array(data["width"]), np.array(data["height"])
+        g = grid.from_separators(self.lines, self.columns)
+        n_cols = g.shape[1]
+        labels = g.labels(left + width / 2, top + height / 2)
+
+        # Sort by cell, then top to bottom: each cell is a contiguous slice, cells in row-major order
+        order = np.lexsort((left, top, labels))
+        bounds = np.flatnonzero(np.diff(labels[order])) + 1
+        blocks = []
+        last_event = {}  # cell label -> index in blocks of its last box, if that box is an event
+        started = set()  # cell labels that already hold a box
+
+        def close_box(label, words, first_line, continued):
+            above = last_event.get(label - n_cols)
+            if continued and above is not None and label not in started:
+                bottom = max(top[k] + height[k] for k in blocks[above])
+                if first_line["top"] - bottom <= first_line["height"]:
+                    blocks[above].extend(words)
+                    started.add(label)
+                    last_event[label] = above
+                    return
+            blocks.append(list(words))
+            started.add(label)
+            if continued:
+                last_event.pop(label, None)
+            else:
+                last_event[label] = len(blocks) - 1
+
+        for cell in np.split(order, bounds):
+            label = labels[cell[0]]
+            # Split the cell into lines
+            lines = []
+            for k in cell:
+                if lines and top[k] < lines[-1]["top"] + lines[-1]["height"] / 2:
+                    lines[-1]["words"].append(k)
+                    lines[-1]["bottom"] = max(lines[-1]["bottom"], top[k] + height[k])
+                else:
+                    lines.append({"top": top[k], "height": height[k], "bottom": top[k] + height[k], "words": [k]})
+
+            words = []
+            first_line = None
+            continued = False
+            previous_bottom = None
+            for line in lines:
+                line_words = sorted(line["words"], key=lambda k: left[k])
+                line_text = " ".join(data["text"][k] for k in line_words)
+                new_event = TIME_PATTERN.match(line_text) is not None
+                gap = previous_bottom is not None and line["top"] - previous_bottom > line["height"]
+                if words and (new_event or gap):
+                    close_box(label, words, first_line, continued)
+                    words = []
+                if not words:
+                    first_line = line
+                    continued = not new_event
+                words.extend(line_words)
+                previous_bottom = line["bottom"]
+            close_box(label, words, first_line, continued)
+
+        results = []
+        for words in blocks:
+            x1 = min(left[k] for k in words)
+            y1 = min(top[k] for k in words)
+            x2 = max(left[k] + width[k] for k in words)
+            y2 = max(top[k] + height[k] for k in words)
+            results.append((int(x1), int(y1), int(x2 - x1), int(y2 - y1),
+                            " ".join(data["text"][k] for k in words),
+                            min(data["conf"][k] for k in words)))
+
+        return {
+            "left": [r[0] for r in results],
+            "top": [r[1] for r in results],
+            "width": [r[2] for r in results],
+            "height": [r[3] for r in results],
+            "text": [r[4] for r in results],
+            "conf": [r[5] for r in results]
+        }
+
+    @staticmethod
+    def _is_weak_box(text: str, conf: float, min_conf: float) -> bool:
+        """
+        Whether a grouped box looks like an event whose time range was misread:
+        it holds two time-like values (or one and a dash) but fails TIME_PATTERN,
+        or it matches TIME_PATTERN with a low confidence.
+        """
+        if TIME_PATTERN.search(text):
+            return conf < min_conf
+        hints = TIME_HINT_PATTERN.findall(text)
+        return len(hints) >= 2 or (len(hints) == 1 and "-" in text)
+
+    def _crop_box(self, data: dict, i: int, dpi: int) -> np.ndarray | None:
+        """
+        Image of the grouped box i, with a small margin, for a new reading.
+        PDF pages are rendered again at dpi; images, and PDF pages deskewed by _find_rulings, are cropped from
+        self.pixels and upscaled twice. None if neither is possible.
+        """
+        x, y, w, h = data["left"][i], data["top"][i], data["width"][i], data["height"][i]
+        pad = max(4, h // 4)
+
+        # The boxes of a deskewed page are in the rotated pixels: a clip of the PDF page would miss them
+        if self.file_path[-3:].lower() == "pdf" and self.ocr_dpi and not self.skew_angle:
+            to_points = 72 / self.ocr_dpi
+            clip = fitz.Rect((x - pad) * to_points, (y - pad) * to_points,
+                             (x + w + pad) * to_points, (y + h + pad) * to_points)
+            return self._render(dpi, clip=clip)
+        if self.pixels is not None:
+            crop = self.pixels[max(0, y - pad):y + h + pad, max(0, x - pad):x + w + pad]
+            return np.asarray(Image.fromarray(crop).resize((crop.shape[1] * 2, crop.shape[0] * 2)))
+        return None
+
+    def _reocr_weak_boxes(self, data: dict, min_conf: float = 60, dpi: int = 600) -> dict:
+        """
+        Reads again the weak event boxes only (see _is_weak_box), at a higher resolution
+        and with the "reocr" OCR profile (one block of text). The new reading is kept if it fixes the
+        time range, or if it is more confident.
+
+        Parameters:
+        - data: grouped dict with keys left, top, width, height, text, conf
+        - min_conf: confidence under which a time range is read again
+        - dpi: resolution of the new reading (PDF files). Images are upscaled twice instead.
+
+        Returns:
+        - data, updated in place
+        """
+        weak = [i for i in range(len(data["text"])) if self._is_weak_box(data["text"][i], data["conf"][i], min_conf)]
+
+        with self.profiler.stage("reocr", boxes=len(data["text"]), weak=len(weak)) as stage:
+            fixed = 0
+            for i in weak:
+                crop = self._crop_box(data, i, dpi)
+                if crop is None:
+                    continue
+
+                new = self._ocr(crop, "reocr")
+                if not new["text"]:
+                    continue
+                text = " ".join(new["text"])
+                conf = min(new["conf"])
+
+                old_ok = TIME_PATTERN.search(data["text"][i]) is not None
+                new_ok = TIME_PATTERN.search(text) is not None
+                if (new_ok and not old_ok) or (new_ok == old_ok and conf > data["conf"][i]):
+                    data["text"][i] = text
+                    data["conf"][i] = conf
+                    fixed += 1
+            stage["fixed"] = fixed
+
+        return data
+
+    def _reread_headers(self, data: dict, dpi: int = 600) -> dict:
+        """
+        Reads again the day headers whose date was not recognized ("lundi 3 fvrier"),
+        with the "headers" OCR profile: French, one line, letters and digits only.
+
+        Returns:
+        - data, updated in place
+        """
+        missed = [i for i, t in enumerate(data["text"]) if WEEKDAY_PATTERN.search(t) and not DATE_PATTERN.search(t)]
+        if not missed:
+            return data
+
+        with self.profiler.stage("reread_headers", headers=len(missed)) as stage:
+            fixed = 0
+            for i in missed:
+                crop = self._crop_box(data, i, dpi)
+                if crop is None:
+                    continue
+                new = self._ocr(crop, "headers")
+                text = " ".join(new["text"])
+                if DATE_PATTERN.search(text):
+                    data["text"][i] = text
+                    data["conf"][i] = min(new["conf"])
+                    fixed += 1
+            stage["fixed"] = fixed
+
+        return data
+
+    def process(self, two_pass: bool = False, layout_dpi: int = 75, ocr_dpi: int | None = None, reocr: bool = True) -> dict:
         """
         Full processing pipeline: load image, extract text, group text boxes.
 
+        Parameters:
+        - two_pass: for PDF files, find the layout at layout_dpi and only OCR the text cells at ocr_dpi
+        - layout_dpi: Resolution of the layout pass (two_pass only)
+        - ocr_dpi: Resolution used for OCR. If None, the one of the layout profile.
+        - reocr: read again the event boxes with a low confidence or a misread time range,
+          and the day headers whose date was not recognized
+
         Returns:
         - Processed OCR data dict
         """
-        self.load_image()
-        self.extract_text()
-        self.get_separators()
+        ocr_dpi = ocr_dpi or self.layout["ocr_dpi"]
+        single_pass = True
+        if two_pass and self.file_path[-3:].lower() == "pdf":
+            self.extract_text_regions(layout_dpi, ocr_dpi)
+            # No table found on the low resolution render (e.g. skewed scan): read the whole page instead
+            single_pass = len(ruling_runs(self.lines)) < 2 or len(ruling_runs(self.columns)) < 2
+
+        if single_pass:
+            # Separators first: get_separators may deskew the page before it is read
+            self.load_image(dpi=ocr_dpi)
+            self.get_separators()
+            self.extract_text()
+
+        return self.group_text(reocr)
+
+    def group_text(self, reocr: bool = True) -> dict:
+        """
+        Groups the OCR words of self.ocr_data into text boxes, using the separators found.
+        Called by process, or directly when the OCR and separators were computed elsewhere (see shared_buffers.py).
+
+        Parameters:
+        - reocr: read again the event boxes with a low confidence or a misread time range,
+          and the day headers whose date was not recognized
 
-        # Regroup sentences
-        data = self._group_lines(self.ocr_data, x_threshold=300, y_threshold=50)
-        # Regroup logical boxes
-        data = self._group_boxes(data, y_threshold=75)
+        Returns:
+        - Processed OCR data dict
+        """
+        if len(self.lines) > 0 and len(self.columns) > 0:
+            # Regroup words by table cell
+            with self.profiler.stage("_group_cells", tokens=len(self.ocr_data["text"])) as stage:
+                data = self._group_cells(self.ocr_data)
+                stage["groups"] = len(data["text"])
+        else:
+            # No table found: regroup sentences, then logical boxes, by distance
+            with self.profiler.stage("_group_lines", tokens=len(self.ocr_data["text"])) as stage:
+                data = self._group_lines(self.ocr_data, x_threshold=self.layout["line_x_threshold"],
+                                         y_threshold=self.layout["line_y_threshold"])
+                stage["groups"] = len(data["text"])
+            with self.profiler.stage("_group_boxes", tokens=len(data["text"])) as stage:
+                data = self._group_boxes(data, x_threshold=self.layout["box_x_threshold"],
+                                         y_threshold=self.layout["box_y_threshold"])
+                stage["groups"] = len(data["text"])
+
+        if reocr:
+            data = self._reocr_weak_boxes(data)
+            data = self._reread_headers(data)
 
         self.ocr_data = data
+        self._release_page()
         return data
 
     @staticmethod
-    def _get_days_indices(strings: list) -> list:
+    def _compact_string_day(s: str, reference: date | None = None, year: int | None = None) -> str:
         """
-        Returns the indices of the French date strings in a list of strings.
+        Converts a date from "weekday num month" (french) to datetime format.
+        The year is the given one, else the one that brings the date closest to the reference date (default: today).
+        Raises ValueError if the day does not exist in that month.
         """
-        date_pattern = re.compile(
-            r'\b\d{1,2}\s+(janvier|février|mars|avril|mai|juin|juillet|août|septembre|octobre|novembre|décembre)\b',
-            re.IGNORECASE
-        )
-        indices = [i for i, s in enumerate(strings) if date_pattern.search(s) and "Le" not in s]
-        indices.sort(key=lambda i: strings[i])
-        return indices
+        match = DATE_PATTERN.search(s)
+        num = int(match.group(1))
+        month = unicodedata.normalize("NFKD", match.group(2).lower()).encode("ascii", "ignore").decode()
+        month_num = MONTHS.index(month) + 1
+
+        if year is not None:
+            return date(year, month_num, num).isoformat()
+        if reference is None:
+            reference = date.today()
+        candidates = []
+        for year in (reference.year - 1, reference.year, reference.year + 1):
+            try:
+                candidates.append(date(year, month_num, num))
+            except ValueError:
+                continue
+        return min(candidates, key=lambda d: abs(d - reference)).isoformat()
 
-    @staticmethod
-    def _compact_string_day(s: str) -> str:
+    def _reference_date(self, strings: list) -> date | None:
         """
-        Converts a date from "weekday num month" (french) to datetime format (2026).
+        Returns the latest full date (dd/mm/yyyy) written on the page, used to infer the year of the headers.
         """
-        parts = s.split(sep=' ')
-        num = int(parts[1])
-        month_num = MONTHS.index(parts[2]) + 1
-        return f"2026-{month_num:02d}-{num:02d}"
+        found = []
+        for s in strings:
+            for d, m, y in FULL_DATE_PATTERN.findall(s):
+                try:
+                    found.append(date(int(y), int(m), int(d)))
+                except ValueError:
+                    continue
+        return max(found) if found else None
 
-    def _get_weeks(self, data: dict) -> tuple:
+    def _classify_tokens(self, data: dict) -> dict:
         """
-        From processed data, returns the weeks of the planning.
+        Tags every text of the processed data once, as a date header, a time range or free text.
 
         Parameters:
         - data: dict with keys left, top, width, height, text
 
         Returns:
-        - Tuple of (week dates list, day x-boundaries list)
-        """
-        days_i = self._get_days_indices(data["text"])
-        days_i_sorted = np.zeros(len(days_i), dtype=int)
-
-        for i in days_i:
-            text_lower = data["text"][i].lower()
-            if "lundi" in text_lower:
-                days_i_sorted[0] = i
-            elif "mardi" in text_lower:
-                days_i_sorted[1] = i
-            elif "mercredi" in text_lower:
-                days_i_sorted[2] = i
-            elif "jeudi" in text_lower:
-                days_i_sorted[3] = i
-            elif "vendredi" in text_lower:
-                days_i_sorted[4] = i
-
-        day_x_positions = [data["left"][i] for i in days_i_sorted]
-        lines_sorted = np.sort(self.columns)
-
-        days_x = []
-        for day_x in day_x_positions:
-            lines_before = lines_sorted[lines_sorted <= day_x]
-            lines_after = lines_sorted[lines_sorted > day_x]
-
-            x_min = lines_before[-1] if len(lines_before) > 0 else 0
-            x_max = lines_after[0] if len(lines_after) > 0 else float('inf')
-
-            days_x.append((x_min, x_max))
-
-        week = []
-        try:
-            for i in range(5):
-                week.append(self._compact_string_day(data["text"][days_i_sorted[i]]))
-        except:
+        - Index dict with keys:
+          tag: list of "date", "time" or "text", one per text
+          date: list of (index, compact date) of the date headers
+          time: list of indices of the texts holding a time range
+          text: list of indices of the other texts
+        """
+        index = {"tag": [], "date": [], "time": [], "text": []}
+
+        for i, s in enumerate(data["text"]):
+            if TIME_PATTERN.search(s):
+                tag = "time"
+                index["time"].append(i)
+            elif DATE_PATTERN.search(s) and "Le" not in s:
+                tag = "date"
+                index["date"].append(i)
+            else:
+                tag = "text"
+                index["text"].append(i)
+            index["tag"].append(tag)
+
+        # The year is only inferred when the caller did not give it
+        reference = None if self.year is not None else self._reference_date([data["text"][i] for i in index["text"]])
+        dates = []
+        for i in index["date"]:
+            try:
+                dates.append((i, self._compact_string_day(data["text"][i], reference, self.year)))
+            except ValueError:
+                # Misread date that does not exist ("31 avril", "0 mars"): not a date header
+                index["tag"][i] = "text"
+                index["text"].append(i)
+        index["date"] = dates
+        index["text"].sort()
+
+        self.token_index = index
+        return index
+
+    def _get_grid(self, data: dict, index: dict) -> grid:
+        """
+        From processed data, returns the grid of the planning with a date for every cell.
+        Any number of weeks (one header row each) and days per week are supported.
+
+        Parameters:
+        - data: dict with keys left, top, width, height, text
+        - index: token index from _classify_tokens
+
+        Returns:
+        - grid object
+        """
+        headers = [i for i, _ in index["date"]]
+        x = np.array([data["left"][i] + data["width"][i] / 2 for i in headers])
+        y = np.array([data["top"][i] + data["height"][i] / 2 for i in headers])
+
+        g = grid.from_separators(self.lines, self.columns)
+        if len(g.x_edges) == 0 and len(headers) > 1:
+            # No vertical ruling found: split the columns halfway between the headers
+            x_sorted = np.unique(x)
+            g = grid(g.y_edges, (x_sorted[:-1] + x_sorted[1:]) / 2)
+
+        g.assign_dates(x, y, [d for _, d in index["date"]])
+
+        if not headers:
             print("Impossible de lire le planning. Si le fichier d'entrée est une photo, considérez utiliser une capture d'écran.")
 
-        return week, days_x
+        self.grid = g
+        return g
 
     @staticmethod
     def _interpret_event_name(e: event):
@@ -352,22 +1015,31 @@ class CalendarReader:
         if self.ocr_data is None:
             self.process()
 
-        week, days_x = self._get_weeks(self.ocr_data)
-        time_pattern = re.compile(r'\d{2}:\d{2} - \d{2}:\d{2}')
-
-        event_indices = [i for i in range(len(self.ocr_data["text"])) if time_pattern.search(self.ocr_data["text"][i])]
-        n = len(event_indices)
-        events = np.zeros(n, dtype=event)
-
-        for idx, i in enumerate(event_indices):
-            name = self.ocr_data["text"][i]
-            x, y, w, h = self.ocr_data["left"][i], self.ocr_data["top"][i], self.ocr_data["width"][i], self.ocr_data["height"][i]
-            b = box(x, y, w, h)
-            events[idx] = event(name, box=b)
-
-        for e in events:
-            e.getWeekdayFromTable(days_x, week)
-            self._interpret_event_name(e)
+        with self.profiler.stage("get_events", tokens=len(self.ocr_data["text"])) as stage:
+            data = self.ocr_data
+            index = self._classify_tokens(data)
+            g = self._get_grid(data, index)
+
+            event_indices = index["time"]
+            n = len(event_indices)
+            events = np.zeros(n, dtype=event)
+
+            for idx, i in enumerate(event_indices):
+                name = data["text"][i]
+                x, y, w, h = data["left"][i], data["top"][i], data["width"][i], data["height"][i]
+                b = box(x, y, w, h)
+                events[idx] = event(name, box=b)
+
+            # Every event takes the date of the cell containing its center
+            x = np.array([data["left"][i] + data["width"][i] / 2 for i in event_indices])
+            y = np.array([data["top"][i] + data["height"][i] / 2 for i in event_indices])
+            days = g.dates_at(x, y) if n > 0 else []
+
+            for e, day in zip(events, days):
+                if day:
+                    e.day = day
+                self._interpret_event_name(e)
+            stage["events"] = n
 
         self.events = events
         return events
@@ -0,0 +1,177 @@
+"""
+CredentialBroker class sharing the Google OAuth token between threads and processes.
+"""
+
+import os
+import time
+import threading
+from datetime import datetime, timezone
+
+from google.auth import credentials as auth_credentials
+from google.auth.exceptions import RefreshError
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+
+
+class FileLock:
+    """
+    Inter-process lock based on the atomic creation of a lock file. Works on Windows and POSIX.
+    A lock older than stale_after seconds is considered abandoned by a crashed process and taken over.
+    """
+
+    def __init__(self, path: str, timeout: float = 30, stale_after: float = 60):
+        self.path = path
+        self.timeout = timeout
+        self.stale_after = stale_after
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode())
+                os.close(fd)
+                return self
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) > self.stale_after:
+                        os.remove(self.path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Could not lock {self.path}")
+                time.sleep(0.05)
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        return False
+
+
+class CredentialBroker:
+    """
+    Shares the credentials stored in token.json between the threads of a process and between processes.
+    The token is refreshed once, ahead of its expiry, under a lock file: other workers
+    find the refreshed token in the file instead of refreshing it again.
+    """
+
+    def __init__(self, token_path: str = "token.json", scopes: list | None = None, refresh_margin: float = 300):
+        """
+        Initialize the broker.
+
+        Parameters:
+        - token_path: Path to the shared token.json
+        - scopes: OAuth scopes of the token
+        - refresh_margin: Seconds before expiry at which the token is refreshed
+        """
+        self.token_path = token_path
+        self.scopes = scopes
+        self.refresh_margin = refresh_margin
+        self._creds = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _seconds_left(self, creds) -> float:
+        """Seconds before the access token expires (infinite if unknown)."""
+        if creds.expiry is None:
+            return float('inf')
+        now = datetime.now(timezone.utc).replace(tzinfo=None)  # google-auth uses naive UTC datetimes
+        return (creds.expiry - now).total_seconds()
+
+    def _fresh(self, creds) -> bool:
+        return creds is not None and bool(creds.token) and self._seconds_left(creds) > self.refresh_margin
+
+    def _read(self) -> Credentials | None:
+        if not os.path.exists(self.token_path):
+            return None
+        return Credentials.from_authorized_user_file(self.token_path, self.scopes)
+
+    def _write(self, creds: Credentials):
+        tmp_path = self.token_path + ".tmp"
+        with open(tmp_path, "w") as token:
+            token.write(creds.to_json())
+        os.replace(tmp_path, self.token_path)
+
+    def store(self, creds: Credentials):
+        """Saves new credentials (e.g. after the interactive login) for all workers."""
+        with self._lock, FileLock(self.token_path + ".lock"):
+            self._write(creds)
+            self._creds = creds
+
+    def get_credentials(self) -> Credentials | None:
+        """
+        Returns valid credentials, refreshing them if they expire within refresh_margin.
+        Raises google.auth.exceptions.RefreshError if the refresh token was revoked.
+
+        Returns:
+        - Credentials, or None when no token is stored yet
+        """
+        with self._lock:
+            if self._fresh(self._creds):
+                return self._creds
+
+            with FileLock(self.token_path + ".lock"):
+                # Another process may have refreshed the token in the meantime
+                creds = self._read()
+                if creds is not None and not self._fresh(creds) and creds.refresh_token:
+                    creds.refresh(Request())
+                    self._write(creds)
+
+            self._creds = creds
+            return creds
+
+    def start(self) -> 'CredentialBroker':
+        """Starts a background thread refreshing the token ahead of expiry."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="credential-broker", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                creds = self.get_credentials()
+                wait = self._seconds_left(creds) - self.refresh_margin if creds else 60
+            except Exception as e:
+                print(f"Token refresh failed: {e}")
+                wait = 60
+            self._stop.wait(min(max(wait, 5), 3600))
+
+
+class BrokeredCredentials(auth_credentials.Credentials):
+    """
+    Credentials of a long-lived API client (googleapiclient service) that always use the broker's token.
+    The broker replaces its Credentials object at each refresh: a service built on one snapshot would keep
+    the old token and, once it expires, refresh it by itself outside the lock file. These credentials take
+    the current token from the broker before each request, and a refresh goes through the broker too.
+    """
+
+    def __init__(self, broker: CredentialBroker):
+        super().__init__()
+        self.broker = broker
+        self._sync()
+
+    def _sync(self):
+        creds = self.broker.get_credentials()  # Cheap while the token is fresh: no file access
+        if creds is None:
+            raise RefreshError("No token stored in " + self.broker.token_path)
+        self.token = creds.token
+        self.expiry = creds.expiry
+
+    def refresh(self, request):
+        self._sync()
+
+    def before_request(self, request, method, url, headers):
+        self._sync()
+        self.apply(headers)
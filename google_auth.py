@@ -13,6 +13,9 @@ from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from google.auth.exceptions import RefreshError
 
+from profiling import Profiler, profiler as default_profiler
+from credential_broker import CredentialBroker, BrokeredCredentials
+
 
 class GoogleAuth:
     """
@@ -22,12 +25,15 @@ class GoogleAuth:
 
     SCOPES = ["https://www.googleapis.com/auth/calendar"]
 
-    def __init__(self, config_path: str | None = None):
+    def __init__(self, config_path: str | None = None, profiler: Profiler | None = None,
+                 broker: CredentialBroker | None = None):
         """
         Initialize GoogleAuth with configuration from a config file.
 
         Parameters:
         - config_path: Path to the config.ini file. If None, uses default location.
+        - profiler: Profiler recording the API latencies. If None, uses the shared profiler (see profiling.py).
+        - broker: CredentialBroker shared by parallel workers. If None, token.json is handled by this instance alone.
         """
         if config_path is None:
             config_path = os.path.join(os.path.dirname(__file__), "config.ini")
@@ -36,7 +42,10 @@ class GoogleAuth:
         self.config = self._load_config()
         self.google_account = self.config.get("Google", "account", fallback=None)
         self.calendars = None
+        self.service = None
         self._creds = None
+        self.broker = broker
+        self.profiler = profiler if profiler is not None else default_profiler
 
     def _load_config(self) -> configparser.ConfigParser:
         """Load configuration from config.ini file."""
@@ -75,6 +84,9 @@ class GoogleAuth:
         Returns:
         - self for method chaining
         """
+        if self.broker is not None:
+            return self._setup_from_broker()
+
         creds, token_path = self._check_token([
             "token.json",
             "D:/OneDrive/Documents/11 - Codes/HDJ_scan/ressources/token.json"
@@ -100,7 +112,32 @@ class GoogleAuth:
                 token.write(creds.to_json())
 
         self._creds = creds
-        self.service = build("calendar", "v3", credentials=creds)
+        with self.profiler.stage("api:discovery"):
+            self.service = build("calendar", "v3", credentials=creds)
+
+        return self
+
+    def _setup_from_broker(self) -> 'GoogleAuth':
+        """
+        Set up the connection with the credentials of the shared broker.
+        The broker refreshes the token for all workers; the interactive login only happens if no valid token exists.
+        """
+        try:
+            creds = self.broker.get_credentials()
+        except RefreshError:
+            # Token is invalid, need to re-authenticate
+            creds = None
+
+        if not creds:
+            creds_path = self._find_credentials_file()
+            flow = InstalledAppFlow.from_client_secrets_file(creds_path, self.SCOPES)
+            creds = flow.run_local_server(port=0)
+            self.broker.store(creds)
+
+        self._creds = creds
+        with self.profiler.stage("api:discovery"):
+            # The service asks the broker for the token before each request, so it follows its refreshes
+            self.service = build("calendar", "v3", credentials=BrokeredCredentials(self.broker))
 
         return self
 
@@ -135,7 +172,8 @@ class GoogleAuth:
             self.setup()
 
         try:
-            calendar_list = self.service.calendarList().list().execute().get('items', []) # type: ignore
+            with self.profiler.stage("api:calendarList.list"):
+                calendar_list = self.service.calendarList().list().execute().get('items', []) # type: ignore
             calendars = []
             for calendar in calendar_list:
                 cal_id = calendar['id']
@@ -148,7 +186,8 @@ class GoogleAuth:
 
         return calendars
 
-    def create_event(self, title: str, beg: str, end: str, calendar_id: str | None = None):
+    def create_event(self, title: str, beg: str, end: str, calendar_id: str | None = None,
+                     event_id: str | None = None) -> str:
         """
         Creates an event in the specified calendar.
 
@@ -157,6 +196,10 @@ class GoogleAuth:
         - beg: Start datetime in ISO format (e.g., '2026-01-01T09:00:00')
         - end: End datetime in ISO format
         - calendar_id: Target calendar ID. If None, uses the default account.
+        - event_id: Google event id to create (base32hex, 5-1024 characters). If None, chosen by Google.
+
+        Returns:
+        - Google event id
         """
         if not self.service:
             self.setup()
@@ -178,21 +221,29 @@ class GoogleAuth:
                 'useDefault': True,
             },
         }
+        if event_id is not None:
+            event['id'] = event_id
 
-        event = self.service.events().insert(calendarId=calendar_id, body=event).execute()
+        with self.profiler.stage("api:events.insert"):
+            event = self.service.events().insert(calendarId=calendar_id, body=event).execute()
         print('Event created: %s' % (event.get('htmlLink')))
+        return event.get('id')
 
-    def export_event(self, event, calendar_id: str | None = None):
+    def export_event(self, event, calendar_id: str | None = None, event_id: str | None = None) -> str:
         """
         Creates a calendar event from an event object.
 
         Parameters:
         - event: Event object with name, day, beg, end attributes
         - calendar_id: Target calendar ID
+        - event_id: Google event id to create, see create_event
+
+        Returns:
+        - Google event id
         """
         date_beg = f"{event.day}T{event.beg}:00"
         date_end = f"{event.day}T{event.end}:00"
-        self.create_event(event.name, date_beg, date_end, calendar_id)
+        return self.create_event(event.name, date_beg, date_end, calendar_id, event_id)
 
     def export_events(self, events_array, calendar_id: str | None = None) -> list:
         """
@@ -206,11 +257,14 @@ class GoogleAuth:
         - List of events that failed to export
         """
         errors = []
-        for event in events_array:
-            if event.flag == 1:
-                try:
-                    self.export_event(event, calendar_id)
-                except Exception as e:
-                    print(f"Failed to create event '{event.name}': {e}")
-                    errors.append(event)
+        with self.profiler.stage("export_events") as stage:
+            for event in events_array:
+                if event.flag == 1:
+                    try:
+                        self.export_event(event, calendar_id)
+                    except Exception as e:
+                        print(f"Failed to create event '{event.name}': {e}")
+                        errors.append(event)
+            stage["events"] = len(events_array)
+            stage["errors"] = len(errors)
         return errors
@@ -0,0 +1,87 @@
+import numpy as np
+
+
+def ruling_runs(indices) -> list:
+    """Collapses pixel indices of separators into sorted (start, end) runs."""
+    if len(indices) == 0:
+        return []
+    indices = np.sort(indices)
+    breaks = np.where(np.diff(indices) > 1)[0]
+    starts = np.concatenate(([indices[0]], indices[breaks + 1]))
+    ends = np.concatenate((indices[breaks], [indices[-1]]))
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+class grid:
+    """
+    Table model of a planning page: rows x columns of cells delimited by the rulings,
+    each cell mapped to a date ('' when unknown).
+    Row r lies between y_edges[r - 1] and y_edges[r], row 0 being above the first ruling.
+    """
+
+    def __init__(self, y_edges, x_edges):
+        self.y_edges = np.sort(np.asarray(y_edges, dtype=float))
+        self.x_edges = np.sort(np.asarray(x_edges, dtype=float))
+        self.dates = np.full((len(self.y_edges) + 1, len(self.x_edges) + 1), '', dtype=object)
+
+    @classmethod
+    def from_separators(cls, lines, columns):
+        """
+        Builds the grid from the separators of CalendarReader.get_separators().
+
+        Parameters:
+        - lines: pixel indices of the horizontal rulings
+        - columns: pixel indices of the vertical rulings
+        """
+        lines = [] if lines is None else lines
+        columns = [] if columns is None else columns
+        y_edges = [(s + e) / 2 for s, e in ruling_runs(lines)]
+        x_edges = [(s + e) / 2 for s, e in ruling_runs(columns)]
+        return cls(y_edges, x_edges)
+
+    @property
+    def shape(self):
+        return self.dates.shape
+
+    def cells(self, x, y) -> tuple:
+        """
+        Returns the (rows, cols) indices of the cells containing the points (x, y).
+        x and y can be scalars or arrays.
+        """
+        rows = np.searchsorted(self.y_edges, y, side="right")
+        cols = np.searchsorted(self.x_edges, x, side="right")
+        return rows, cols
+
+    def labels(self, x, y) -> np.ndarray:
+        """Returns one integer label per point (x, y): points with the same label are in the same cell."""
+        rows, cols = self.cells(x, y)
+        return rows * (len(self.x_edges) + 1) + cols
+
+    def assign_dates(self, x, y, dates):
+        """
+        Maps the cells to dates from the date headers found at (x, y).
+        Every cell takes the date of its column in the closest header row above it,
+        so that a page can hold several weeks, one header row per week.
+
+        Parameters:
+        - x, y: arrays of header centers
+        - dates: list of dates (YYYY-MM-DD) of the headers
+        """
+        n_rows, n_cols = self.shape
+        headers = np.full((n_rows, n_cols), '', dtype=object)
+        has_header = np.zeros((n_rows, n_cols), dtype=bool)
+
+        rows, cols = self.cells(np.asarray(x), np.asarray(y))
+        for r, c, d in zip(rows, cols, dates):
+            headers[r, c] = d
+            has_header[r, c] = True
+
+        # Forward fill the rows with the index of the last header row
+        source = np.where(has_header.any(axis=1), np.arange(n_rows), 0)
+        source = np.maximum.accumulate(source)
+        self.dates = headers[source[:, None], np.arange(n_cols)[None, :]]
+
+    def dates_at(self, x, y) -> np.ndarray:
+        """Returns the dates of the cells containing the points (x, y), vectorized."""
+        rows, cols = self.cells(x, y)
+        return self.dates[rows, cols]
@@ -1,7 +1,8 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
 import cv2
 import numpy as np
 from PIL import Image, ImageDraw
-import matplotlib.pyplot as plt
 
 
 def locate_quadrilaterals(img):
@@ -9,16 +10,12 @@ def locate_quadrilaterals(img):
     Locate quadrilaterals in the image.
     
     Parameters:
-    img (PIL.Image): The input image.
+    img (PIL.Image or np.ndarray): The input image, RGB or grayscale.
 
     Returns:
     list: A list of quadrilaterals, each represented by a list of four points.
     """
-    # Convert PIL image to OpenCV format
-    open_cv_image = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
-    
-    # Convert to grayscale
-    gray = cv2.cvtColor(open_cv_image, cv2.COLOR_BGR2GRAY)
+    gray = to_gray(img)
     
     # Apply edge detection
     edges = cv2.Canny(gray, 50, 150, apertureSize=3)
@@ -53,6 +50,14 @@ def locate_quadrilaterals(img):
     
     return np.array(quadrilaterals)
 
+def to_gray(img):
+    """Returns a PIL image or a NumPy array (RGB or grayscale) as a grayscale uint8 array."""
+    if isinstance(img, Image.Image):
+        return np.asarray(img if img.mode == "L" else img.convert("L"))
+    if img.ndim == 3:
+        return cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+    return img
+
 def perimeter(box):
     return np.sum([np.linalg.norm(box[i] - box[(i + 1) % 4]) for i in range(4)])
 
@@ -73,17 +78,18 @@ def quad_to_rectangle(quad):
 
     return rect
 
-def best_rectangle(quads,img):
-    box_sizes =np.array( [perimeter(box) for box in quads])
-    try :
-        max_perimeter = img.width/5 * 4
-    except:
-        max_perimeter = img.shape[1]/5 * 4
-    i_out = 0
-    for i in range(len(quads)):
-        if box_sizes[i] > box_sizes[i_out] and box_sizes[i] < max_perimeter:
-            i_out = i
-    return quads[i_out]
+def best_rectangle(quads, img, max_fraction=0.98):
+    """
+    Returns the quadrilateral of the page: the largest one, ignoring the frame of the image itself
+    (a quadrilateral covering more than max_fraction of the image).
+    """
+    try:
+        image_area = img.width * img.height
+    except AttributeError:
+        image_area = img.shape[0] * img.shape[1]
+    areas = np.array([cv2.contourArea(np.asarray(quad, dtype=np.float32)) for quad in quads])
+    areas[areas > max_fraction * image_area] = 0
+    return quads[int(np.argmax(areas))]
 
 
 def find_homography(quads,img):
@@ -95,13 +101,14 @@ def find_homography(quads,img):
     homography, _ = cv2.findHomography(start_pos, aim_pos)
     return homography
 
-def correct_perspective(img, homography):
+def correct_perspective(img, homography, border_value=0):
     """
     Correct the perspective of the image.
     """
 
     # Apply the homography
-    img = cv2.warpPerspective(img, homography, (int(img.shape[1]*1.2), int(img.shape[0]*1.2)))
+    img = cv2.warpPerspective(img, homography, (int(img.shape[1]*1.2), int(img.shape[0]*1.2)),
+                              borderValue=border_value)
     return img
 
 def process(img):
@@ -113,7 +120,177 @@ def process(img):
     return Image.fromarray(cv2.cvtColor(new_img, cv2.COLOR_BGR2RGB))
 
 
+def rectify(img, skew_tolerance=0.005, min_score=0.3):
+    """
+    Corrects the perspective of a photo of a planning, unless it is already fronto-parallel.
+
+    Parameters:
+    img (PIL.Image, np.ndarray or str): The input image (RGB or grayscale), or its path.
+    skew_tolerance (float): Largest corner displacement, as a fraction of the image diagonal,
+        under which the image is considered fronto-parallel and returned unchanged.
+    min_score (float): Smallest score for which the image is warped. Below it, the quadrilateral found is
+        more likely a table cell or a shadow than the page, and the image is returned unchanged.
+
+    Returns:
+    tuple: (image, homography, score). image has the type and mode of the input (a PIL image for a path),
+        homography is None when the image was not warped, score is the fraction of the image covered
+        by the page quadrilateral (0 when none was found).
+    """
+    if isinstance(img, str):
+        img = Image.open(img)
+    gray = to_gray(img)
+    height, width = gray.shape
+
+    quads = locate_quadrilaterals(gray)
+    if len(quads) == 0:
+        return img, None, 0.0
+
+    start_pos = best_rectangle(quads, gray)
+    aim_pos = quad_to_rectangle(start_pos)
+    score = float(cv2.contourArea(start_pos.astype(np.float32))) / (width * height)
+    if score < min_score:
+        return img, None, score
+
+    displacement = np.max(np.linalg.norm(start_pos - aim_pos, axis=1))
+    if displacement <= skew_tolerance * np.hypot(width, height):
+        return img, None, score
+
+    homography, _ = cv2.findHomography(start_pos, aim_pos)
+    if homography is None:
+        return img, None, 0.0
+
+    if isinstance(img, Image.Image):
+        pixels = np.asarray(img.convert("L") if img.mode not in ("L", "RGB") else img)
+        white = 255 if pixels.ndim == 2 else (255, 255, 255)
+        return Image.fromarray(correct_perspective(pixels, homography, white)), homography, score
+    white = 255 if img.ndim == 2 else (255, 255, 255)
+    return correct_perspective(img, homography, white), homography, score
+
+
+def _segments(mask, horizontal, min_span):
+    """
+    Fits a line on every connected component of a ruling mask spanning at least min_span pixels.
+
+    Returns:
+    np.ndarray: One row per ruling: x1, y1, x2, y2, angle (degrees from the horizontal, resp. vertical, axis),
+        position (y, resp. x, of the ruling at the middle of the page), thickness.
+    """
+    height, width = mask.shape
+    n, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    span = stats[:, cv2.CC_STAT_WIDTH if horizontal else cv2.CC_STAT_HEIGHT]
+    rows = []
+    for k in np.where(span >= min_span)[0]:
+        if k == 0:
+            continue  # Background
+        x, y, w, h = stats[k, :4]
+        ys, xs = np.nonzero(labels[y:y + h, x:x + w] == k)
+        points = np.column_stack((xs + x, ys + y)).astype(np.float32)
+        vx, vy, x0, y0 = cv2.fitLine(points, cv2.DIST_L2, 0, 0.01, 0.01).ravel()
+        if horizontal:
+            slope = vy / vx
+            x1, x2 = x, x + w - 1
+            y1, y2 = y0 + (x1 - x0) * slope, y0 + (x2 - x0) * slope
+            position = y0 + (width / 2 - x0) * slope
+            angle = np.degrees(np.arctan(slope))
+        else:
+            slope = vx / vy
+            y1, y2 = y, y + h - 1
+            x1, x2 = x0 + (y1 - y0) * slope, x0 + (y2 - y0) * slope
+            position = x0 + (height / 2 - y0) * slope
+            angle = -np.degrees(np.arctan(slope))
+        thickness = stats[k, cv2.CC_STAT_AREA] / max(span[k], 1)
+        rows.append((x1, y1, x2, y2, angle, position, thickness))
+    return np.array(rows, dtype=float).reshape(-1, 7)
+
+
+def find_rulings(gray, min_line=0.4, min_column=0.25, block_size=None):
+    """
+    Finds the table rulings of a page with morphology, robust to skew and uneven lighting (photos).
+    The page is binarized with an adaptive threshold, then long horizontal and vertical openings keep
+    the rulings only; each remaining component is fitted with a line.
+
+    Parameters:
+    gray (np.ndarray): Grayscale uint8 page, white background.
+    min_line (float): Shortest horizontal ruling, as a fraction of the page width.
+    min_column (float): Shortest vertical ruling, as a fraction of the page height.
+    block_size (int): Neighbourhood of the adaptive threshold (odd). If None, about 1/50 of the page.
+
+    Returns:
+    tuple: (horizontal, vertical, angle). horizontal and vertical are the segments arrays of _segments,
+        angle is the median skew of the rulings in degrees (positive: rotated clockwise).
+    """
+    height, width = gray.shape
+    if block_size is None:
+        block_size = max(15, min(height, width) // 50) | 1
+    binary = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, block_size, 15)
+
+    found = []
+    for horizontal, size, min_span in ((True, width, min_line * width), (False, height, min_column * height)):
+        # Short enough for a ruling a few degrees off the axis to stay inside the kernel band
+        length = max(15, size // 50)
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (length, 1) if horizontal else (1, length))
+        mask = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel)
+        # Join the pieces of a ruling broken by the opening or by the scan
+        join = cv2.getStructuringElement(cv2.MORPH_RECT, (3 * length, 3) if horizontal else (3, 3 * length))
+        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, join)
+        found.append(_segments(mask, horizontal, min_span))
+
+    horizontal, vertical = found
+    angles = np.concatenate((horizontal[:, 4], vertical[:, 4]))
+    angle = float(np.median(angles)) if len(angles) > 0 else 0.0
+    return horizontal, vertical, angle
+
+
+def ruling_indices(segments, size):
+    """
+    Converts ruling segments (see find_rulings) to the pixel indices returned by
+    CalendarReader.get_separators: every row (or column) covered by a ruling at the middle of the page.
+    """
+    indices = []
+    for position, thickness in segments[:, 5:7]:
+        start = int(round(position - thickness / 2))
+        indices.extend(range(max(0, start), min(size, start + max(1, int(round(thickness))))))
+    return np.unique(np.array(indices, dtype=int))
+
+
+def deskew(gray, angle):
+    """
+    Rotates a grayscale page by -angle degrees around its center, keeping its size, with a white border.
+    A ruling at position p (see _segments) moves to center + (p - center) * cos(angle).
+    """
+    height, width = gray.shape
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    return cv2.warpAffine(gray, matrix, (width, height), flags=cv2.INTER_LINEAR, borderValue=255)
+
+
+def _rectify_item(args):
+    img, kwargs = args
+    return rectify(img, **kwargs)
+
+
+def rectify_batch(images, workers=None, **kwargs):
+    """
+    Rectifies a list of images in parallel, one process per core.
+
+    Parameters:
+    images (list): PIL images, NumPy arrays or paths. Paths are opened in the workers, so the
+        photos are not sent between processes.
+    workers (int): Number of worker processes. If None, the number of CPUs.
+    kwargs: arguments of rectify (skew_tolerance)
+
+    Returns:
+    list: A (image, homography, score) tuple per input, in order (see rectify).
+    """
+    workers = min(workers or os.cpu_count(), len(images))
+    if workers <= 1:
+        return [rectify(img, **kwargs) for img in images]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_rectify_item, [(img, kwargs) for img in images]))
+
+
 if __name__ == "__main__":
+    import matplotlib.pyplot as plt
+
     # Load the image
     img = Image.open("image.jpg")
     img_cv = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
@@ -0,0 +1,417 @@
+"""
+File-system job queue for scanning plannings on several machines sharing a directory.
+
+    python job_queue.py submit  //serveur/scans plannings/*.pdf
+    python job_queue.py worker  //serveur/scans --processes 4
+    python job_queue.py bench   /tmp/queue --workers 1 2 4 --jobs 40 --kind sleep
+
+A job is a JSON file moving between the directories of the queue:
+
+    pending/<shard>/<id>.json -> leased/<id>.json -> done/<id>.json or failed/<id>.json
+
+Every move is an os.replace on the same file system, atomic on local disks and SMB/NFS shares:
+when several workers try to lease the same job, exactly one succeeds. A leased job's modification
+time is its heartbeat; a job whose worker stopped beating for lease_time seconds is put back in
+pending by the reaper (any worker), up to max_attempts times. Hosts must have synchronized clocks.
+Each lease writes a new token in the leased file: a worker whose job was reaped, and maybe leased
+by another worker, can no longer extend, complete or fail it.
+SQLite is not used because its locking is unreliable on network shares.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import socket
+import argparse
+import threading
+import multiprocessing
+
+
+class JobQueue:
+    """
+    Queue stored in a directory. Pending jobs are spread over shards (sub-directories), so that
+    many workers do not all list and race for the same directory: a worker starts from its own shard
+    and takes jobs from the others when it is empty.
+    """
+
+    def __init__(self, root: str, lease_time: float = 120, max_attempts: int = 3, shards: int = 8):
+        """
+        Open (and create if needed) a queue.
+
+        Parameters:
+        - root: Shared directory of the queue
+        - lease_time: Seconds without heartbeat after which a leased job is considered abandoned
+        - max_attempts: Number of leases of a job before it is moved to failed
+        - shards: Number of pending sub-directories. Must be the same for all the users of the queue.
+        """
+        self.root = root
+        self.lease_time = lease_time
+        self.max_attempts = max_attempts
+        self.shards = shards
+        for name in ["tmp", "leased", "done", "failed"] + [os.path.join("pending", f"{k:02d}") for k in range(shards)]:
+            os.makedirs(os.path.join(root, name), exist_ok=True)
+
+    def _path(self, *parts) -> str:
+        return os.path.join(self.root, *parts)
+
+    def _shard(self, job_id: str) -> str:
+        return os.path.join("pending", f"{int(job_id[:8], 16) % self.shards:02d}")
+
+    def _write(self, path: str, job: dict):
+        """Writes a job file atomically: readers never see a partial file."""
+        tmp_path = self._path("tmp", f"{uuid.uuid4().hex}.json")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _read(path: str) -> dict:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def submit(self, file_path: str | None = None, kind: str = "scan", **args) -> str:
+        """
+        Adds a job.
+
+        Parameters:
+        - file_path: File to scan (absolute, or relative to a directory all the hosts share)
+        - kind: Handler of the job, see HANDLERS
+        - args: Arguments of the handler, e.g. CalendarReader.process arguments for "scan"
+
+        Returns:
+        - Job id
+        """
+        job_id = uuid.uuid4().hex
+        job = {"id": job_id, "kind": kind, "file": file_path, "args": args, "attempts": 0,
+               "submitted": time.time()}
+        self._write(self._path(self._shard(job_id), f"{job_id}.json"), job)
+        return job_id
+
+    def lease(self, worker: str, home_shard: int = 0) -> dict | None:
+        """
+        Takes a pending job. The job gets a new lease token: heartbeat, complete and fail only act
+        on the leased file while it still holds this token.
+
+        Returns:
+        - The job dict, or None when no job is pending
+        """
+        for k in range(self.shards):
+            shard = self._path("pending", f"{(home_shard + k) % self.shards:02d}")
+            names = os.listdir(shard)
+            random.shuffle(names)  # Workers of the same shard try different jobs first
+            for name in names:
+                pending_path = os.path.join(shard, name)
+                leased_path = self._path("leased", name)
+                try:
+                    # os.replace keeps the modification time: a job that waited more than lease_time would
+                    # look abandoned to the reaper until the lease is written below
+                    os.utime(pending_path)
+                    os.replace(pending_path, leased_path)
+                except (FileNotFoundError, PermissionError):
+                    continue  # Taken by another worker
+                job = self._read(leased_path)
+                job["attempts"] += 1
+                job["worker"] = worker
+                job["leased"] = time.time()
+                job["lease"] = uuid.uuid4().hex
+                self._write(leased_path, job)
+                return job
+        return None
+
+    def _lease_token(self, job_id: str) -> str | None:
+        """Lease token of a leased job, or None if the job is not leased."""
+        try:
+            return self._read(self._path("leased", f"{job_id}.json")).get("lease")
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _claim(self, job_id: str, token: str, max_mtime: float | None = None) -> str | None:
+        """
+        Moves a leased job out of leased/ if it still holds the lease token, so that no other worker
+        or reaper can move it meanwhile. The token is checked again once the file is moved:
+        if the job was leased again in between, it is put back.
+
+        Parameters:
+        - max_mtime: Also require a heartbeat older than this time (reaper)
+
+        Returns:
+        - Path of the claimed file in tmp/, or None if the lease was lost
+        """
+        if self._lease_token(job_id) != token:
+            return None
+        leased_path = self._path("leased", f"{job_id}.json")
+        # The claim time is in the name: the reaper gives back the claims of crashed workers
+        claimed_path = self._path("tmp", f"{job_id}.{int(time.time())}.claim")
+        try:
+            os.replace(leased_path, claimed_path)
+        except FileNotFoundError:
+            return None
+        job = self._read(claimed_path)
+        if job.get("lease") != token or (max_mtime is not None and os.path.getmtime(claimed_path) > max_mtime):
+            os.replace(claimed_path, leased_path)
+            return None
+        return claimed_path
+
+    def heartbeat(self, job: dict) -> bool:
+        """Extends the lease of a job. Returns False if the lease was lost (job reaped or leased again)."""
+        if self._lease_token(job["id"]) != job["lease"]:
+            return False
+        try:
+            os.utime(self._path("leased", f"{job['id']}.json"))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def complete(self, job: dict, result) -> bool:
+        """
+        Stores the result of a job and ends its lease.
+
+        Returns:
+        - False if the lease was lost meanwhile: the job was given to another worker
+        """
+        claimed_path = self._claim(job["id"], job["lease"])
+        if claimed_path is None:
+            return False
+        self._write(self._path("done", f"{job['id']}.json"), {**job, "result": result, "finished": time.time()})
+        os.remove(claimed_path)
+        return True
+
+    def fail(self, job: dict, error: str) -> bool:
+        """
+        Puts a job back in pending, or in failed after max_attempts.
+
+        Returns:
+        - False if the lease was lost meanwhile: the job is left to its new worker
+        """
+        claimed_path = self._claim(job["id"], job["lease"])
+        if claimed_path is None:
+            return False
+        job = {**job, "error": error}
+        if job["attempts"] >= self.max_attempts:
+            target = self._path("failed", f"{job['id']}.json")
+        else:
+            target = self._path(self._shard(job["id"]), f"{job['id']}.json")
+        self._write(claimed_path, job)
+        os.replace(claimed_path, target)
+        return True
+
+    def reap(self) -> int:
+        """
+        Puts back the abandoned jobs (no heartbeat for lease_time seconds), and the jobs left claimed
+        in tmp/ by a worker that crashed while completing or failing them.
+
+        Returns:
+        - Number of jobs put back in pending or moved to failed
+        """
+        now = time.time()
+        for name in os.listdir(self._path("tmp")):
+            if name.endswith(".claim") and now - int(name.split(".")[1]) >= self.lease_time:
+                try:
+                    os.replace(self._path("tmp", name), self._path("leased", name.split(".")[0] + ".json"))
+                except FileNotFoundError:
+                    pass
+
+        reaped = 0
+        for name in os.listdir(self._path("leased")):
+            path = self._path("leased", name)
+            try:
+                if now - os.path.getmtime(path) < self.lease_time:
+                    continue
+                job = self._read(path)
+            except (FileNotFoundError, json.JSONDecodeError):
+                continue
+            # A heartbeat or a new lease since the check keeps the job leased
+            claimed_path = self._claim(job["id"], job.get("lease"), max_mtime=now - self.lease_time)
+            if claimed_path is None:
+                continue
+            if job["attempts"] >= self.max_attempts:
+                target = self._path("failed", name)
+                job["error"] = "lease expired"
+                self._write(claimed_path, job)
+            else:
+                target = self._path(self._shard(job["id"]), name)
+            os.replace(claimed_path, target)
+            reaped += 1
+        return reaped
+
+    def counts(self) -> dict:
+        """Number of jobs per state."""
+        return {
+            "pending": sum(len(os.listdir(self._path("pending", f"{k:02d}"))) for k in range(self.shards)),
+            "leased": len(os.listdir(self._path("leased"))),
+            "done": len(os.listdir(self._path("done"))),
+            "failed": len(os.listdir(self._path("failed")))
+        }
+
+    def result(self, job_id: str) -> dict | None:
+        """Returns the finished job (with its "result" or "error"), or None if it is not finished."""
+        for state in ("done", "failed"):
+            path = self._path(state, f"{job_id}.json")
+            if os.path.exists(path):
+                return self._read(path)
+        return None
+
+
+# --- Handlers ---
+
+def scan_job(job: dict) -> dict:
+    """Reads a planning with CalendarReader."""
+    from calendar_reader import CalendarReader
+
+    args = dict(job["args"])
+    with CalendarReader(job["file"], page=args.pop("page", 0)) as reader:
+        reader.process(**args)
+        return {"events": [e.to_dict() for e in reader.get_events()]}
+
+
+def sleep_job(job: dict) -> dict:
+    """Waits args["seconds"]: measures the queue overhead and scaling without OCR."""
+    time.sleep(job["args"].get("seconds", 0.1))
+    return {}
+
+
+HANDLERS = {"scan": scan_job, "sleep": sleep_job}
+
+
+class Worker:
+    """Leases jobs from a queue and runs them, beating the lease while a job runs."""
+
+    def __init__(self, queue: JobQueue, name: str | None = None, poll_interval: float = 1.0):
+        self.queue = queue
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.poll_interval = poll_interval
+        self.home_shard = random.randrange(queue.shards)
+        self._stop = threading.Event()
+
+    def _beat(self, job: dict, done: threading.Event):
+        while not done.wait(self.queue.lease_time / 3):
+            if not self.queue.heartbeat(job):
+                return
+
+    def run_one(self) -> bool:
+        """Runs one job. Returns False if none was pending."""
+        self.queue.reap()
+        job = self.queue.lease(self.name, self.home_shard)
+        if job is None:
+            return False
+
+        done = threading.Event()
+        beat = threading.Thread(target=self._beat, args=(job, done), daemon=True)
+        beat.start()
+        try:
+            result = HANDLERS[job["kind"]](job)
+        except Exception as e:
+            done.set()
+            if self.queue.fail(job, repr(e)):
+                print(f"{self.name}: {job['id']} échec ({e})")
+            else:
+                print(f"{self.name}: {job['id']} échec après la fin de son bail ({e}), ignoré")
+        else:
+            done.set()
+            if not self.queue.complete(job, result):
+                print(f"{self.name}: {job['id']} terminé après la fin de son bail, résultat ignoré")
+        beat.join()
+        return True
+
+    def run(self, idle_exit: float | None = None):
+        """
+        Runs jobs until stop() is called.
+
+        Parameters:
+        - idle_exit: Stop after this many seconds without pending job. If None, wait forever.
+        """
+        idle_since = time.monotonic()
+        while not self._stop.is_set():
+            if self.run_one():
+                idle_since = time.monotonic()
+            elif idle_exit is not None and time.monotonic() - idle_since > idle_exit:
+                break
+            else:
+                self._stop.wait(self.poll_interval)
+
+    def stop(self):
+        self._stop.set()
+
+
+def run_worker(root: str, idle_exit: float | None = None, poll_interval: float = 1.0, **queue_kwargs):
+    """Entry point of a worker process."""
+    Worker(JobQueue(root, **queue_kwargs), poll_interval=poll_interval).run(idle_exit)
+
+
+def bench(root: str, workers: list, jobs: int, kind: str = "sleep", files: list | None = None,
+          seconds: float = 0.2) -> dict:
+    """
+    Measures the wall time to run the same jobs with 1..N local worker processes.
+
+    Returns:
+    - Dict workers -> seconds
+    """
+    timings = {}
+    for n in workers:
+        queue = JobQueue(os.path.join(root, f"bench-{n}"))
+        for i in range(jobs):
+            if kind == "scan":
+                queue.submit(files[i % len(files)])
+            else:
+                queue.submit(kind=kind, seconds=seconds)
+
+        start = time.perf_counter()
+        processes = [multiprocessing.Process(target=run_worker, args=(queue.root, 0.5, 0.05)) for _ in range(n)]
+        for p in processes:
+            p.start()
+        for p in processes:
+            p.join()
+        timings[n] = time.perf_counter() - start
+        counts = queue.counts()
+        print(f"{n:>3} workers: {timings[n]:7.2f} s, {jobs / timings[n]:6.2f} jobs/s, "
+              f"{counts['done']} done, {counts['failed']} failed")
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="File d'attente partagée des scans de plannings.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("submit", help="Ajoute des fichiers à scanner")
+    p.add_argument("root")
+    p.add_argument("files", nargs="+")
+    p.add_argument("--two-pass", action="store_true")
+
+    p = sub.add_parser("worker", help="Traite les scans de la file")
+    p.add_argument("root")
+    p.add_argument("--processes", type=int, default=1)
+    p.add_argument("--lease", type=float, default=120, help="Secondes sans signe de vie avant reprise d'un scan")
+
+    p = sub.add_parser("bench", help="Mesure le débit de 1 à N processus locaux")
+    p.add_argument("root")
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    p.add_argument("--jobs", type=int, default=20)
+    p.add_argument("--kind", choices=sorted(HANDLERS), default="sleep")
+    p.add_argument("--files", nargs="*", default=None, help="Fichiers scannés (--kind scan)")
+
+    args = parser.parse_args()
+    if args.command == "submit":
+        queue = JobQueue(args.root)
+        for f in args.files:
+            print(queue.submit(os.path.abspath(f), two_pass=args.two_pass), f)
+    elif args.command == "worker":
+        if args.processes == 1:
+            run_worker(args.root, lease_time=args.lease)
+        else:
+            processes = [multiprocessing.Process(target=run_worker, args=(args.root,), kwargs={"lease_time": args.lease})
+                         for _ in range(args.processes)]
+            for p in processes:
+                p.start()
+            for p in processes:
+                p.join()
+    elif args.command == "bench":
+        if args.kind == "scan" and not args.files:
+            sys.exit("--files est requis avec --kind scan")
+        bench(args.root, args.workers, args.jobs, args.kind, args.files)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+"""
+OCR backends used by CalendarReader.
+
+PytesseractBackend runs one tesseract process per call (temporary image file, model reload, TSV parsing).
+TesserocrBackend keeps a Tesseract handle alive in the process, one per thread, and reads NumPy buffers directly.
+
+OCR_PROFILES are the Tesseract settings of each kind of text of a planning (see OcrProfile).
+"""
+
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections import namedtuple
+import numpy as np
+from PIL import Image
+import pytesseract
+
+
+def filter_ocr(ocr_results: dict) -> dict:
+    """
+    Keeps the non-empty entries of a pytesseract-like dict.
+
+    Returns:
+    - Dict with keys: left, top, width, height, text, conf (0-100 word confidence)
+    """
+    valid_indices = [i for i, t in enumerate(ocr_results["text"]) if t.strip()]
+
+    return {
+        "left": [int(ocr_results["left"][i]) for i in valid_indices],
+        "top": [int(ocr_results["top"][i]) for i in valid_indices],
+        "width": [int(ocr_results["width"][i]) for i in valid_indices],
+        "height": [int(ocr_results["height"][i]) for i in valid_indices],
+        "text": [ocr_results["text"][i] for i in valid_indices],
+        "conf": [float(ocr_results["conf"][i]) for i in valid_indices]
+    }
+
+
+# Tesseract settings for one kind of text:
+# - lang: languages, e.g. "fra" or "fra+eng". Missing languages are dropped, down to "eng".
+# - psm: page segmentation mode (None: automatic layout analysis, 6: one block, 7: one line)
+# - oem: engine mode (None: default, 1: LSTM only)
+# - whitelist: characters allowed, or None
+# - dictionary: whether the word lists are loaded (without them, Tesseract starts faster and does not
+#   "correct" non-words)
+OcrProfile = namedtuple("OcrProfile", ["name", "lang", "psm", "oem", "whitelist", "dictionary"])
+
+FRENCH_LETTERS = "abcdefghijklmnopqrstuvwxyzàâäçéèêëîïôöùûüABCDEFGHIJKLMNOPQRSTUVWXYZÀÂÇÉÈÊÎÔÛ"
+
+OCR_PROFILES = {
+    # Whole page with its layout unknown: slowest, used when no table was found beforehand
+    "full_page": OcrProfile("full_page", "fra", None, None, None, True),
+    # One table cell: an event (time range and title) or an hour label
+    "event_cells": OcrProfile("event_cells", "fra", 6, 1, None, True),
+    # One day header, "lundi 3 mars": a single line of letters and digits
+    "headers": OcrProfile("headers", "fra", 7, 1, FRENCH_LETTERS + "0123456789/", False),
+}
+
+
+def get_profile(profile) -> OcrProfile:
+    """Returns an OcrProfile from its name in OCR_PROFILES, or the profile itself."""
+    if isinstance(profile, str):
+        return OCR_PROFILES[profile]
+    return profile
+
+
+def profile_variables(profile: OcrProfile) -> dict:
+    """Tesseract variables of a profile."""
+    variables = {}
+    if profile.whitelist:
+        variables["tessedit_char_whitelist"] = profile.whitelist
+    if not profile.dictionary:
+        variables["load_system_dawg"] = "0"
+        variables["load_freq_dawg"] = "0"
+    return variables
+
+
+class OcrBackend(ABC):
+    """
+    Interface of the OCR engines: image_to_data returns the words found in an image.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def image_to_data(self, image, lang: str = "eng", psm: int | None = None, oem: int | None = None,
+                      variables: dict | None = None) -> dict:
+        """
+        Reads the words of an image.
+
+        Parameters:
+        - image: PIL Image or grayscale uint8 NumPy array
+        - lang: Tesseract language
+        - psm: Tesseract page segmentation mode. If None, Tesseract's default (3, automatic)
+        - oem: Tesseract engine mode. If None, Tesseract's default
+        - variables: Tesseract variables, e.g. {"tessedit_char_whitelist": "0123456789"}
+
+        Returns:
+        - Dict with keys: left, top, width, height, text, conf (only non-empty entries)
+        """
+
+    @abstractmethod
+    def languages(self) -> set:
+        """Installed Tesseract languages."""
+
+    def resolve_lang(self, lang: str) -> str:
+        """Drops the languages of lang ("fra+eng") that are not installed, falling back to "eng"."""
+        if not hasattr(self, "_languages"):
+            try:
+                self._languages = self.languages()
+            except Exception:
+                self._languages = None  # Unknown: let Tesseract report it
+        if self._languages is None:
+            return lang
+
+        parts = [part for part in lang.split("+") if part in self._languages]
+        if len(parts) < len(lang.split("+")):
+            missing = set(lang.split("+")) - set(parts)
+            warned = getattr(self, "_warned", set())
+            if not missing <= warned:
+                print(f"Langue(s) Tesseract non installée(s) : {', '.join(sorted(missing))}")
+                self._warned = warned | missing
+        return "+".join(parts) if parts else "eng"
+
+    def read(self, image, profile) -> dict:
+        """
+        Reads the words of an image with the settings of a profile.
+
+        Parameters:
+        - image: PIL Image or grayscale uint8 NumPy array
+        - profile: OcrProfile or name in OCR_PROFILES
+
+        Returns:
+        - Dict with keys: left, top, width, height, text, conf (only non-empty entries)
+        """
+        profile = get_profile(profile)
+        return self.image_to_data(image, lang=self.resolve_lang(profile.lang), psm=profile.psm,
+                                  oem=profile.oem, variables=profile_variables(profile))
+
+
+class PytesseractBackend(OcrBackend):
+    """Runs the tesseract executable through pytesseract, one process per call."""
+
+    name = "pytesseract"
+
+    def image_to_data(self, image, lang: str = "eng", psm: int | None = None, oem: int | None = None,
+                      variables: dict | None = None) -> dict:
+        if isinstance(image, np.ndarray):
+            image = Image.fromarray(image)
+        config = []
+        if psm is not None:
+            config.append(f"--psm {psm}")
+        if oem is not None:
+            config.append(f"--oem {oem}")
+        for key, value in (variables or {}).items():
+            config.append(f"-c {key}={value}")
+        config = " ".join(config)
+        ocr_results = pytesseract.image_to_data(
+            image, lang=lang, config=config, output_type=pytesseract.Output.DICT
+        )
+        return filter_ocr(ocr_results)
+
+    def languages(self) -> set:
+        return set(pytesseract.get_languages(config=""))
+
+
+class TesserocrBackend(OcrBackend):
+    """
+    In-process Tesseract through tesserocr.
+    The API handles (and their loaded traineddata) are kept alive per thread and reused for every call,
+    one per language, engine mode and dictionary setting.
+    """
+
+    # Only read when the handle is created; the other variables are set before each call
+    INIT_VARIABLES = ("load_system_dawg", "load_freq_dawg")
+
+    name = "tesserocr"
+
+    def __init__(self):
+        import tesserocr  # Optional dependency, raises ImportError when missing
+        self._tesserocr = tesserocr
+        self._local = threading.local()
+
+    def _api(self, lang: str, oem: int | None, init_variables: dict):
+        """Returns the handle of the current thread for these settings, created on first use."""
+        apis = getattr(self._local, "apis", None)
+        if apis is None:
+            apis = self._local.apis = {}
+        key = (lang, oem, tuple(sorted(init_variables.items())))
+        if key not in apis:
+            oem = self._tesserocr.OEM(oem) if oem is not None else self._tesserocr.OEM.DEFAULT
+            apis[key] = self._tesserocr.PyTessBaseAPI(lang=lang, oem=oem, variables=init_variables)
+        return apis[key]
+
+    def languages(self) -> set:
+        return set(self._tesserocr.get_languages()[1])
+
+    def image_to_data(self, image, lang: str = "eng", psm: int | None = None, oem: int | None = None,
+                      variables: dict | None = None) -> dict:
+        variables = variables or {}
+        init_variables = {k: v for k, v in variables.items() if k in self.INIT_VARIABLES}
+        api = self._api(lang, oem, init_variables)
+        api.SetPageSegMode(psm if psm is not None else self._tesserocr.PSM.AUTO)
+        api.SetVariable("tessedit_char_whitelist", variables.get("tessedit_char_whitelist", ""))
+
+        if isinstance(image, np.ndarray):
+            pixels = np.ascontiguousarray(image, dtype=np.uint8)  # No copy for rendered pages and photos
+            height, width = pixels.shape
+            buffer = memoryview(pixels).cast("B")
+            try:
+                api.SetImageBytes(buffer, width, height, 1, width)
+            except TypeError:
+                # tesserocr up to 2.7 converts imagedata to bytes and rejects buffers: one more copy of the page,
+                # on top of the one SetImageBytes always makes into a Leptonica Pix
+                api.SetImageBytes(bytes(buffer), width, height, 1, width)
+        else:
+            api.SetImage(image)
+        api.Recognize()
+
+        data = {"left": [], "top": [], "width": [], "height": [], "text": [], "conf": []}
+        iterator = api.GetIterator()
+        if iterator is None:
+            return data
+
+        level = self._tesserocr.RIL.WORD
+        for word in self._tesserocr.iterate_level(iterator, level):
+            text = word.GetUTF8Text(level)
+            bbox = word.BoundingBox(level)
+            if not text or not text.strip() or bbox is None:
+                continue
+            x1, y1, x2, y2 = bbox
+            data["left"].append(x1)
+            data["top"].append(y1)
+            data["width"].append(x2 - x1)
+            data["height"].append(y2 - y1)
+            data["text"].append(text)
+            data["conf"].append(float(word.Confidence(level)))
+        return data
+
+
+_backends = {}
+
+
+def get_backend(name: str | None = None) -> OcrBackend:
+    """
+    Returns a shared OCR backend, created once per process.
+
+    Parameters:
+    - name: "tesserocr", "pytesseract" or "auto" (tesserocr when installed, else pytesseract).
+      If None, uses the SCAN_OCR_BACKEND environment variable, default "auto".
+    """
+    if name is None:
+        name = os.environ.get("SCAN_OCR_BACKEND", "auto")
+
+    if name not in _backends:
+        if name in ("auto", "tesserocr"):
+            try:
+                _backends[name] = TesserocrBackend()
+            except ImportError:
+                if name == "tesserocr":
+                    raise
+                _backends[name] = PytesseractBackend()
+        elif name == "pytesseract":
+            _backends[name] = PytesseractBackend()
+        else:
+            raise ValueError(f"Unknown OCR backend: {name}")
+
+    return _backends[name]
@@ -0,0 +1,151 @@
+"""
+Incremental scanning of multi-page PDF plannings.
+
+Each page is fingerprinted from its content stream and images. The events parsed from a page are
+stored per fingerprint, so a republished PDF only costs the rendering and OCR of its changed pages.
+"""
+
+import os
+import re
+import json
+import hashlib
+import fitz  # PyMuPDF for PDF processing
+
+from calendar_reader import CalendarReader
+from event import event
+
+
+REFERENCE_PATTERN = re.compile(r"\b(\d+) 0 R\b")
+
+
+def _resources(page) -> str:
+    """/Resources entry of a page, inherited from the page tree if the page has none."""
+    doc = page.parent
+    xref = page.xref
+    while xref:
+        kind, value = doc.xref_get_key(xref, "Resources")
+        if kind != "null":
+            return value
+        kind, value = doc.xref_get_key(xref, "Parent")
+        xref = int(value.split()[0]) if kind == "xref" else 0
+    return ""
+
+
+def page_fingerprint(page) -> str:
+    """
+    Hashes what is drawn on a PDF page: its size, content streams, and every object its resources
+    reference, followed recursively: images, fonts, and Form XObjects with their own resources.
+    Scanned pages have the same content stream from one version to the next, and pages made of imported
+    pages (show_pdf_page) only draw a Form XObject: their content is in the resources.
+    """
+    doc = page.parent
+    h = hashlib.sha256()
+    h.update(repr(tuple(page.rect)).encode())
+    h.update(page.read_contents())
+
+    resources = _resources(page)
+    h.update(resources.encode())
+    todo = [int(x) for x in REFERENCE_PATTERN.findall(resources)]
+    seen = set()
+    while todo:
+        xref = todo.pop()
+        if xref in seen:
+            continue
+        seen.add(xref)
+        definition = doc.xref_object(xref, compressed=True)
+        h.update(definition.encode())
+        if doc.xref_is_stream(xref):
+            h.update(doc.xref_stream_raw(xref) or b"")
+        todo.extend(int(x) for x in REFERENCE_PATTERN.findall(definition))
+    return h.hexdigest()
+
+
+def diff_events(old: list, new: list) -> dict:
+    """
+    Compares two scan results.
+
+    Returns:
+    - Dict with lists of events: added (only in new), removed (only in old), unchanged
+    """
+    def key(e):
+        return (e.day, e.beg, e.end, e.name.strip())
+
+    old_keys = {key(e) for e in old}
+    new_keys = {key(e) for e in new}
+    return {
+        "added": [e for e in new if key(e) not in old_keys],
+        "removed": [e for e in old if key(e) not in new_keys],
+        "unchanged": [e for e in new if key(e) in old_keys]
+    }
+
+
+class PageCache:
+    """
+    JSON file holding the events parsed per page fingerprint,
+    and the fingerprints of the last scan of every document.
+    """
+
+    def __init__(self, path: str = "scan_cache.json"):
+        self.path = path
+        self.pages = {}
+        self.documents = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                content = json.load(f)
+            self.pages = content.get("pages", {})
+            self.documents = content.get("documents", {})
+
+    def get(self, key: str) -> list | None:
+        """Returns the cached events of a page, or None."""
+        if key not in self.pages:
+            return None
+        return [event.from_dict(d) for d in self.pages[key]]
+
+    def put(self, key: str, events):
+        self.pages[key] = [e.to_dict() for e in events]
+
+    def save(self):
+        """Writes the cache, dropping the pages no document refers to anymore."""
+        used = {k for keys in self.documents.values() for k in keys}
+        self.pages = {k: v for k, v in self.pages.items() if k in used}
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"pages": self.pages, "documents": self.documents}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def scan(self, file_path: str, **process_kwargs) -> tuple:
+        """
+        Scans all pages of a PDF, reading only the pages not seen before.
+
+        Parameters:
+        - file_path: Path to the PDF file
+        - process_kwargs: arguments of CalendarReader.process (ocr_dpi, two_pass...), part of the cache key
+
+        Returns:
+        - Tuple of (events list, diff dict against the previous scan of the same file, see diff_events)
+        """
+        doc_key = os.path.abspath(file_path)
+        params = json.dumps(process_kwargs, sort_keys=True)
+        previous = [e for key in self.documents.get(doc_key, []) for e in (self.get(key) or [])]
+
+        keys = []
+        events = []
+        doc = fitz.open(file_path)
+        try:
+            for n, page in enumerate(doc):
+                key = hashlib.sha256((page_fingerprint(page) + params).encode()).hexdigest()
+                page_events = self.get(key)
+                if page_events is None:
+                    with CalendarReader(file_path, page=n) as reader:
+                        reader.process(**process_kwargs)
+                        page_events = list(reader.get_events())
+                    self.put(key, page_events)
+                keys.append(key)
+                events.extend(page_events)
+        finally:
+            doc.close()
+
+        self.documents[doc_key] = keys
+        self.save()
+        return events, diff_events(previous, events)
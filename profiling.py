@@ -0,0 +1,150 @@
+"""
+Profiler class for timing the stages of the scan pipeline.
+
+Disabled by default. Set the SCAN_PROFILE environment variable to 1 (or pass enabled=True)
+to record the stages, and SCAN_PROFILE_LOG to a file path to also append them as JSON lines.
+Only the last records are kept in memory (max_records): a long-running service keeps a constant footprint,
+and the full history is in the log file.
+"""
+
+import os
+import json
+import time
+from collections import deque
+
+
+class _NullStage:
+    """Stage returned when profiling is disabled: does nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def __setitem__(self, key, value):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    """Times one stage. Extra fields (token counts, pixel counts...) can be set with stage[key] = value."""
+
+    def __init__(self, profiler: 'Profiler', name: str, fields: dict):
+        self.profiler = profiler
+        self.fields = fields
+        self.fields["stage"] = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.fields["duration"] = time.perf_counter() - self._start
+        if exc_type is not None:
+            self.fields["error"] = exc_type.__name__
+        self.profiler.record(self.fields)
+        return False
+
+    def __setitem__(self, key, value):
+        self.fields[key] = value
+
+
+class Profiler:
+    """
+    Records the duration and counters of named stages.
+    When disabled, stage() returns a shared no-op context manager.
+    """
+
+    def __init__(self, enabled: bool | None = None, log_path: str | None = None, max_records: int = 10000):
+        """
+        Initialize the Profiler.
+
+        Parameters:
+        - enabled: If None, enabled when the SCAN_PROFILE environment variable is set and not "0"
+        - log_path: JSON lines file the records are appended to. If None, uses SCAN_PROFILE_LOG.
+        - max_records: Number of records kept in memory for summary() and report(), the oldest are dropped
+        """
+        if enabled is None:
+            enabled = os.environ.get("SCAN_PROFILE", "0") not in ("", "0")
+        if log_path is None:
+            log_path = os.environ.get("SCAN_PROFILE_LOG")
+
+        self.enabled = enabled
+        self.log_path = log_path
+        self.records = deque(maxlen=max_records)
+
+    def stage(self, name: str, **fields):
+        """
+        Context manager timing a stage.
+
+        Parameters:
+        - name: Stage name, e.g. "load_image" or "api:events.insert"
+        - fields: Counters known before the stage starts
+
+        Usage:
+            with profiler.stage("extract_text") as stage:
+                ...
+                stage["tokens"] = n
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, fields)
+
+    def record(self, fields: dict):
+        """Stores a finished stage and appends it to the log file if any."""
+        self.records.append(fields)
+        if self.log_path:
+            with open(self.log_path, "a", encoding="utf-8") as log:
+                log.write(json.dumps(fields, default=str) + "\n")
+
+    def summary(self) -> dict:
+        """
+        Aggregates the records kept in memory by stage.
+
+        Returns:
+        - Dict stage -> {count, total, mean, max} durations in seconds
+        """
+        stats = {}
+        for r in self.records:
+            s = stats.setdefault(r["stage"], {"count": 0, "total": 0.0, "max": 0.0})
+            s["count"] += 1
+            s["total"] += r["duration"]
+            s["max"] = max(s["max"], r["duration"])
+        for s in stats.values():
+            s["mean"] = s["total"] / s["count"]
+        return stats
+
+    def page_summary(self, prefix: str = "ocr:") -> dict:
+        """
+        Time spent per page in the stages starting with prefix, e.g. per OCR profile.
+        Only the records with "file" and "page" fields are counted.
+
+        Returns:
+        - Dict stage -> {pages, mean} with the mean duration per page in seconds
+        """
+        totals = {}
+        for r in self.records:
+            if r["stage"].startswith(prefix) and "page" in r:
+                pages = totals.setdefault(r["stage"], {})
+                key = (r.get("file"), r["page"])
+                pages[key] = pages.get(key, 0.0) + r["duration"]
+        return {name: {"pages": len(pages), "mean": sum(pages.values()) / len(pages)}
+                for name, pages in totals.items()}
+
+    def report(self):
+        """Prints the summary, slowest stages first, then the OCR time per page of each profile."""
+        stats = sorted(self.summary().items(), key=lambda kv: -kv[1]["total"])
+        for name, s in stats:
+            print(f"{name:<28} {s['count']:>5} x {s['mean'] * 1000:9.1f} ms = {s['total']:8.3f} s")
+        for name, s in self.page_summary().items():
+            print(f"{name:<28} {s['pages']:>5} pages x {s['mean'] * 1000:9.1f} ms / page")
+
+    def clear(self):
+        self.records.clear()
+
+
+# Shared profiler, used when no profiler is given to CalendarReader or GoogleAuth
+profiler = Profiler()
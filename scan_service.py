@@ -0,0 +1,427 @@
+"""
+Local scan service: keeps OCR worker processes and an authorized Google Calendar client alive between scans.
+
+    python scan_service.py --workers 2
+
+The service listens on 127.0.0.1 only (port 8765, or SCAN_SERVICE_PORT) and speaks JSON over HTTP:
+
+    GET  /health                 -> {"status": "ok"}
+    POST /scan    {"file", "process"}  -> {"job": id}
+    GET  /jobs/<id>              -> {"status": "queued" | "running" | "done" | "failed", "error"}
+    GET  /jobs/<id>/events       -> {"events": [event dicts]}
+    GET  /calendars              -> {"calendars": [[id, name], ...]}
+    POST /export  {"events", "calendar_id"} -> {"errors": [indexes of the events that failed]}
+
+Every request must carry the secret of the user in the X-Scan-Token header: the secret is created by the
+service in ~/.scan_service_secret (or SCAN_SERVICE_SECRET), readable by its owner only. Requests with an
+Origin header (web pages) or, for POST, without a JSON body are rejected.
+
+Other users of the workstation can share the worker pool with --shared-secret (or SCAN_SERVICE_SHARED_SECRET):
+a second secret, readable by the group of the file (chgrp it to the users' group). With it, a client may only
+scan: it sends the content of the file ({"content": base64, "suffix": ".pdf"} instead of "file"), since the
+service must not read the owner's files on behalf of another user, and /calendars and /export are refused,
+so that no export runs on the owner's Google account. These clients export with their own GoogleAuth.
+
+App_scan uses it through ScanClient when it is running, and falls back to scanning in-process otherwise.
+"""
+
+import os
+import hmac
+import json
+import base64
+import tempfile
+import time
+import uuid
+import secrets
+import argparse
+import threading
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from event import event
+
+
+DEFAULT_PORT = int(os.environ.get("SCAN_SERVICE_PORT", "8765"))
+SECRET_PATH = os.environ.get("SCAN_SERVICE_SECRET", os.path.join(os.path.expanduser("~"), ".scan_service_secret"))
+SHARED_SECRET_PATH = os.environ.get("SCAN_SERVICE_SHARED_SECRET")
+TOKEN_HEADER = "X-Scan-Token"
+MAX_UPLOAD = 50 * 2 ** 20  # Bytes of a file sent by a shared client
+
+
+def load_secret(path: str = SECRET_PATH, create: bool = False, shared: bool = False) -> str | None:
+    """
+    Reads the secret shared by the service and its clients.
+
+    Parameters:
+    - path: Secret file
+    - create: create the file when it does not exist
+    - shared: secret of the other users (see module docstring): permissions 0640 instead of 0600
+
+    Returns:
+    - The secret, or None when the file does not exist and create is False
+    """
+    mode = 0o640 if shared else 0o600
+    if create:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, mode)
+            with os.fdopen(fd, "w") as f:
+                f.write(secrets.token_urlsafe(32))
+            if os.name == "posix":
+                os.chmod(path, mode)  # Whatever the umask
+        except FileExistsError:
+            pass
+    if not os.path.exists(path):
+        return None
+    if os.name == "posix" and os.stat(path).st_mode & ~mode & 0o077:
+        raise PermissionError(f"{path} est lisible par d'autres utilisateurs : chmod {mode:o} {path}")
+    with open(path, encoding="utf-8") as f:
+        return f.read().strip()
+
+
+# --- Worker processes ---
+
+def _warm_worker(ocr_backend: str | None):
+    """Imports the reader and loads the Tesseract models of all the OCR profiles once, when the worker starts."""
+    import numpy as np
+    from ocr_backend import get_backend, OCR_PROFILES
+    blank = np.full((32, 32), 255, dtype=np.uint8)
+    for profile in OCR_PROFILES:
+        get_backend(ocr_backend).read(blank, profile)
+
+
+def _scan_job(file_path: str, process_kwargs: dict, ocr_backend: str | None) -> list:
+    from calendar_reader import CalendarReader
+
+    with CalendarReader(file_path, ocr_backend=ocr_backend) as reader:
+        reader.process(**process_kwargs)
+        return [e.to_dict() for e in reader.get_events()]
+
+
+# --- Service ---
+
+class ScanService:
+    """
+    Scan jobs run in a pool of warm worker processes. Exports go through one GoogleAuth,
+    set up at the first request that needs it and then shared by all the clients of the owner.
+    """
+
+    def __init__(self, port: int = DEFAULT_PORT, workers: int = 2, ocr_backend: str | None = None,
+                 max_jobs: int = 200, secret_path: str = SECRET_PATH, shared_secret_path: str | None = SHARED_SECRET_PATH):
+        """
+        Initialize the service.
+
+        Parameters:
+        - port: Local TCP port
+        - workers: Number of OCR worker processes
+        - ocr_backend: OCR backend name of the workers (see ocr_backend.get_backend)
+        - max_jobs: Number of finished jobs kept for polling
+        - secret_path: Secret file of the user, created if needed (see load_secret)
+        - shared_secret_path: Secret file of the other users, allowed to scan only. If None, not shared.
+        """
+        self.port = port
+        self.secret = load_secret(secret_path, create=True)
+        self.shared_secret = load_secret(shared_secret_path, create=True, shared=True) if shared_secret_path else None
+        self.ocr_backend = ocr_backend
+        self.max_jobs = max_jobs
+        self.jobs = {}
+        self._jobs_lock = threading.Lock()
+        self._auth = None
+        self._auth_lock = threading.Lock()
+        self._pool = ProcessPoolExecutor(max_workers=workers, initializer=_warm_worker, initargs=(ocr_backend,))
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+
+    def auth(self):
+        """The shared Google client. The googleapiclient service is not thread-safe: use it under _auth_lock."""
+        if self._auth is None:
+            from google_auth import GoogleAuth
+            from credential_broker import CredentialBroker
+            self._auth = GoogleAuth(broker=CredentialBroker(scopes=GoogleAuth.SCOPES).start()).setup()
+        return self._auth
+
+    def submit(self, file_path: str, process_kwargs: dict, temporary: bool = False) -> str:
+        """
+        Queues a scan.
+
+        Parameters:
+        - temporary: file_path is a copy sent by a shared client, removed once scanned
+        """
+        job_id = uuid.uuid4().hex
+        job = {"status": "queued", "file": file_path, "temporary": temporary, "submitted": time.time()}
+        with self._jobs_lock:
+            self.jobs[job_id] = job
+            self._forget_old_jobs()
+        job["future"] = self._pool.submit(_scan_job, file_path, process_kwargs, self.ocr_backend)
+        job["future"].add_done_callback(lambda f: self._finish(job, f))
+        return job_id
+
+    @staticmethod
+    def status(job: dict) -> str:
+        if job["status"] == "queued" and job["future"].running():
+            return "running"
+        return job["status"]
+
+    def submit_content(self, content: bytes, suffix: str, process_kwargs: dict) -> str:
+        """Queues the scan of a file sent by a shared client, written to a temporary file of the service."""
+        fd, file_path = tempfile.mkstemp(suffix=suffix, prefix="scan_")
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        return self.submit(file_path, process_kwargs, temporary=True)
+
+    @staticmethod
+    def _finish(job: dict, future):
+        try:
+            job["events"] = future.result()
+            job["status"] = "done"
+        except Exception as e:
+            job["error"] = repr(e)
+            job["status"] = "failed"
+        if job["temporary"]:
+            os.remove(job["file"])
+
+    def _forget_old_jobs(self):
+        finished = [k for k, j in self.jobs.items() if j["status"] in ("done", "failed")]
+        for k in sorted(finished, key=lambda k: self.jobs[k]["submitted"])[:max(0, len(self.jobs) - self.max_jobs)]:
+            del self.jobs[k]
+
+    def calendars(self) -> list:
+        with self._auth_lock:
+            return self.auth().get_calendars()
+
+    def export(self, events: list, calendar_id: str | None) -> list:
+        """Exports event dicts; returns the indexes of the events that failed."""
+        objects = [event.from_dict(d) for d in events]
+        with self._auth_lock:
+            errors = self.auth().export_events(objects, calendar_id)
+        failed = {id(e) for e in errors}
+        return [i for i, e in enumerate(objects) if id(e) in failed]
+
+    def _handler(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, code: int, body: dict):
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _body(self) -> dict:
+                length = int(self.headers.get("Content-Length", 0))
+                if length > 2 * MAX_UPLOAD:  # base64 and JSON around the largest file
+                    raise ValueError("request too large")
+                return json.loads(self.rfile.read(length) or b"{}")
+
+            def _rejected(self) -> bool:
+                """
+                Sends an error and returns True if the request does not come from a client of the owner
+                or, with the shared secret, of another user (self.shared).
+                """
+                host = self.headers.get("Host", "").split(":")[0]
+                if host not in ("127.0.0.1", "localhost") or self.headers.get("Origin"):
+                    self._send(403, {"error": "forbidden"})  # Web page, or DNS rebinding
+                    return True
+                token = self.headers.get(TOKEN_HEADER, "").encode()
+                self.shared = False
+                if hmac.compare_digest(token, service.secret.encode()):
+                    return False
+                if service.shared_secret is not None and hmac.compare_digest(token, service.shared_secret.encode()):
+                    self.shared = True
+                    return False
+                self._send(401, {"error": "invalid token"})
+                return True
+
+            def do_GET(self):
+                if self._rejected():
+                    return
+                try:
+                    self._get()
+                except Exception as e:
+                    self._send(500, {"error": repr(e)})
+
+            def do_POST(self):
+                if self._rejected():
+                    return
+                if self.headers.get("Content-Type", "").split(";")[0].strip() != "application/json":
+                    return self._send(415, {"error": "application/json expected"})
+                try:
+                    self._post()
+                except Exception as e:
+                    self._send(500, {"error": repr(e)})
+
+            def _get(self):
+                parts = self.path.strip("/").split("/")
+                if parts == ["health"]:
+                    return self._send(200, {"status": "ok"})
+                if parts == ["calendars"]:
+                    if self.shared:
+                        return self._send(403, {"error": "reserved to the owner of the service"})
+                    return self._send(200, {"calendars": service.calendars()})
+                if len(parts) >= 2 and parts[0] == "jobs":
+                    job = service.jobs.get(parts[1])
+                    if job is None:
+                        return self._send(404, {"error": "unknown job"})
+                    if len(parts) == 2:
+                        return self._send(200, {"status": service.status(job), "error": job.get("error")})
+                    if parts[2] == "events":
+                        if job["status"] != "done":
+                            return self._send(409, {"error": f"job {service.status(job)}"})
+                        return self._send(200, {"events": job["events"]})
+                self._send(404, {"error": "not found"})
+
+            def _post(self):
+                try:
+                    body = self._body()
+                except json.JSONDecodeError:
+                    return self._send(400, {"error": "invalid JSON"})
+                except ValueError:
+                    self.close_connection = True  # The body was not read
+                    return self._send(413, {"error": "request too large"})
+                if self.path == "/scan" and self.shared:
+                    # Only the content: the service must not read the owner's files for another user
+                    if "content" not in body:
+                        return self._send(403, {"error": "shared clients send the file content"})
+                    suffix = os.path.splitext(body.get("suffix", ""))[1] or ".pdf"
+                    content = base64.b64decode(body["content"])
+                    return self._send(200, {"job": service.submit_content(content, suffix, body.get("process", {}))})
+                if self.path == "/scan":
+                    if not os.path.isfile(body.get("file", "")):
+                        return self._send(400, {"error": "file not found"})
+                    return self._send(200, {"job": service.submit(body["file"], body.get("process", {}))})
+                if self.path == "/export":
+                    if self.shared:
+                        return self._send(403, {"error": "reserved to the owner of the service"})
+                    return self._send(200, {"errors": service.export(body["events"], body.get("calendar_id"))})
+                self._send(404, {"error": "not found"})
+
+            def log_message(self, format, *args):
+                pass  # Polling would flood the console
+
+        return Handler
+
+    def serve_forever(self):
+        print(f"Service de scan sur http://127.0.0.1:{self.port}")
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        self.server.shutdown()
+
+
+# --- Client ---
+
+class ScanClient:
+    """
+    Client of a running ScanService. get_calendars and export_events have the signatures of GoogleAuth's,
+    so the GUI can use either. A client of another user than the owner (shared) can only scan.
+    """
+
+    def __init__(self, port: int = DEFAULT_PORT, timeout: float = 30, secret: str | None = None,
+                 shared_secret_path: str | None = SHARED_SECRET_PATH):
+        """
+        Parameters:
+        - secret: Secret of the service. If None, read from SECRET_PATH.
+        - shared_secret_path: Shared secret file, tried when the service refuses the user's own secret
+        """
+        self.url = f"http://127.0.0.1:{port}"
+        self.timeout = timeout
+        self.shared = False
+        self._candidates = []  # (secret, shared), in the order they are tried
+        try:
+            self._candidates.append((secret if secret is not None else load_secret(), False))
+            if shared_secret_path:
+                self._candidates.append((load_secret(shared_secret_path, shared=True), True))
+        except PermissionError as e:
+            print(e)
+        self._candidates = [c for c in self._candidates if c[0] is not None]
+        self.secret = self._candidates[0][0] if self._candidates else None
+
+    def _request(self, path: str, body: dict | None = None, timeout: float | None = None) -> dict:
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        request = urllib.request.Request(self.url + path, data=data,
+                                         headers={"Content-Type": "application/json", TOKEN_HEADER: self.secret or ""})
+        with urllib.request.urlopen(request, timeout=timeout or self.timeout) as response:
+            return json.loads(response.read())
+
+    def available(self) -> bool:
+        """True if the service answers and accepts one of the secrets (see shared)."""
+        for secret, shared in self._candidates:
+            self.secret, self.shared = secret, shared
+            try:
+                if self._request("/health", timeout=0.5).get("status") == "ok":
+                    return True
+            except (OSError, ValueError):
+                continue
+        return False
+
+    def submit(self, file_path: str, **process_kwargs) -> str:
+        if self.shared:
+            with open(file_path, "rb") as f:
+                content = base64.b64encode(f.read()).decode("ascii")
+            body = {"content": content, "suffix": os.path.splitext(file_path)[1], "process": process_kwargs}
+        else:
+            body = {"file": os.path.abspath(file_path), "process": process_kwargs}
+        return self._request("/scan", body)["job"]
+
+    def status(self, job_id: str) -> dict:
+        return self._request(f"/jobs/{job_id}")
+
+    def events(self, job_id: str) -> list:
+        return [event.from_dict(d) for d in self._request(f"/jobs/{job_id}/events")["events"]]
+
+    def scan(self, file_path: str, poll_interval: float = 0.2, timeout: float = 600, **process_kwargs) -> list:
+        """
+        Scans a file in the service and waits for the events.
+
+        Returns:
+        - List of event objects
+        """
+        job_id = self.submit(file_path, **process_kwargs)
+        deadline = time.monotonic() + timeout
+        while True:
+            status = self.status(job_id)
+            if status["status"] == "done":
+                return self.events(job_id)
+            if status["status"] == "failed":
+                raise RuntimeError(f"Scan failed: {status['error']}")
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Scan of {file_path} still {status['status']}")
+            time.sleep(poll_interval)
+
+    def get_calendars(self) -> list:
+        return [tuple(c) for c in self._request("/calendars")["calendars"]]
+
+    def export_events(self, events_array, calendar_id: str | None = None) -> list:
+        """
+        Exports the events through the service.
+
+        Returns:
+        - List of events that failed to export
+        """
+        events_array = list(events_array)
+        body = {"events": [e.to_dict() for e in events_array],
+                "calendar_id": calendar_id}
+        failed = self._request("/export", body, timeout=max(self.timeout, 10 * len(events_array)))["errors"]
+        return [events_array[i] for i in failed]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Service local de scan des plannings.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=2, help="Nombre de processus OCR")
+    parser.add_argument("--ocr-backend", default=None, help="tesserocr, pytesseract ou auto")
+    parser.add_argument("--shared-secret", default=SHARED_SECRET_PATH,
+                        help="Secret des autres utilisateurs, autorisés à scanner seulement (ex: /srv/scan/secret)")
+    args = parser.parse_args()
+
+    ScanService(port=args.port, workers=args.workers, ocr_backend=args.ocr_backend,
+                shared_secret_path=args.shared_secret).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
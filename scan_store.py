@@ -0,0 +1,323 @@
+"""
+ScanStore class: local SQLite database of the scanned plannings and of their export to Google Calendar.
+
+Documents are identified by the SHA-256 of the file, so a planning scanned twice is recognized and its
+events are read back from the database instead of running the OCR again. Every export attempt is
+recorded per event and calendar: an export interrupted by a crash resumes with the events not yet created.
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import fitz  # PyMuPDF for PDF processing
+from googleapiclient.errors import HttpError
+
+from calendar_reader import CalendarReader
+from page_cache import page_fingerprint
+from event import event
+from box import box
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    sha256 TEXT NOT NULL UNIQUE,
+    path TEXT NOT NULL,
+    scanned_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY,
+    document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    page INTEGER NOT NULL,
+    fingerprint TEXT,
+    UNIQUE (document_id, page)
+);
+CREATE TABLE IF NOT EXISTS tokens (
+    page_id INTEGER NOT NULL REFERENCES pages(id) ON DELETE CASCADE,
+    left INTEGER, top INTEGER, width INTEGER, height INTEGER,
+    text TEXT, conf REAL
+);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    page_id INTEGER NOT NULL REFERENCES pages(id) ON DELETE CASCADE,
+    day TEXT, beg TEXT, end TEXT, name TEXT, flag INTEGER,
+    x INTEGER, y INTEGER, w INTEGER, h INTEGER
+);
+CREATE TABLE IF NOT EXISTS exports (
+    event_id INTEGER NOT NULL REFERENCES events(id) ON DELETE CASCADE,
+    calendar_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    google_id TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    updated_at TEXT,
+    PRIMARY KEY (event_id, calendar_id)
+);
+CREATE INDEX IF NOT EXISTS idx_documents_sha256 ON documents(sha256);
+CREATE INDEX IF NOT EXISTS idx_pages_fingerprint ON pages(fingerprint);
+CREATE INDEX IF NOT EXISTS idx_tokens_page ON tokens(page_id);
+CREATE INDEX IF NOT EXISTS idx_events_page ON events(page_id);
+CREATE INDEX IF NOT EXISTS idx_events_day_beg ON events(day, beg);
+"""
+
+
+def file_sha256(file_path: str) -> str:
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def read_document(file_path: str, process_kwargs: dict | None = None) -> list:
+    """
+    Reads all the pages of a file with CalendarReader.
+
+    Returns:
+    - List of (page number, page fingerprint or None, OCR data, list of events), as taken by ScanStore.save_document
+    """
+    if file_path[-3:].lower() == "pdf":
+        doc = fitz.open(file_path)
+        try:
+            fingerprints = [page_fingerprint(page) for page in doc]
+        finally:
+            doc.close()
+    else:
+        fingerprints = [None]
+
+    pages = []
+    for n, fingerprint in enumerate(fingerprints):
+        with CalendarReader(file_path, page=n) as reader:
+            data = reader.process(**(process_kwargs or {}))
+            pages.append((n, fingerprint, data, list(reader.get_events())))
+    return pages
+
+
+class ScanStore:
+    """
+    SQLite database with the tables documents, pages, tokens (grouped OCR boxes), events and exports.
+    One connection is shared by the threads of the process, behind a lock.
+    """
+
+    def __init__(self, path: str = "scan_store.db"):
+        """
+        Open (and create if needed) the database.
+
+        Parameters:
+        - path: SQLite file
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA journal_mode = WAL")  # Committed scans survive a crash of the writer
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    # --- Scans ---
+
+    def find_document(self, sha256: str) -> int | None:
+        """Returns the id of a document already stored with its pages, or None."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT d.id FROM documents d WHERE d.sha256 = ? AND EXISTS (SELECT 1 FROM pages p WHERE p.document_id = d.id)",
+                (sha256,)).fetchone()
+        return row[0] if row else None
+
+    def save_document(self, file_path: str, sha256: str, pages: list) -> int:
+        """
+        Stores a scanned document in one transaction.
+
+        Parameters:
+        - file_path: Path of the scanned file
+        - sha256: Hash of the file (see file_sha256)
+        - pages: List of (page number, fingerprint or None, OCR data dict, events list)
+
+        Returns:
+        - Document id. If the same file was stored meanwhile by another thread, its id.
+        """
+        with self._lock, self.conn:
+            row = self.conn.execute("SELECT id FROM documents WHERE sha256 = ?", (sha256,)).fetchone()
+            if row is not None:
+                if self.conn.execute("SELECT 1 FROM pages WHERE document_id = ?", (row[0],)).fetchone():
+                    return row[0]
+                document_id = row[0]
+            else:
+                document_id = self.conn.execute(
+                    "INSERT INTO documents (sha256, path, scanned_at) VALUES (?, ?, ?)",
+                    (sha256, os.path.abspath(file_path), _now())).lastrowid
+
+            for n, fingerprint, data, events in pages:
+                page_id = self.conn.execute(
+                    "INSERT INTO pages (document_id, page, fingerprint) VALUES (?, ?, ?)",
+                    (document_id, n, fingerprint)).lastrowid
+                self.conn.executemany(
+                    "INSERT INTO tokens (page_id, left, top, width, height, text, conf) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(page_id, int(data["left"][i]), int(data["top"][i]), int(data["width"][i]),
+                      int(data["height"][i]), data["text"][i],
+                      float(data["conf"][i]) if "conf" in data else None) for i in range(len(data["text"]))])
+                self.conn.executemany(
+                    "INSERT INTO events (page_id, day, beg, end, name, flag, x, y, w, h) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(page_id, e.day, e.beg, e.end, e.name, int(e.flag), *(int(v) for v in e.box.unpack()))
+                     for e in events])
+        return document_id
+
+    def scan(self, file_path: str, executor=None, **process_kwargs) -> tuple:
+        """
+        Returns the events of a file, running CalendarReader on all its pages only if the file is new.
+
+        Parameters:
+        - file_path: Path to the PDF or image file
+        - executor: ProcessPoolExecutor reading the file (see read_document). If None, read in the calling thread.
+        - process_kwargs: arguments of CalendarReader.process (two_pass, ocr_dpi...)
+
+        Returns:
+        - Tuple of (document id, list of (event id, event))
+        """
+        sha256 = file_sha256(file_path)
+        document_id = self.find_document(sha256)
+        if document_id is None:
+            if executor is not None:
+                pages = executor.submit(read_document, file_path, process_kwargs).result()
+            else:
+                pages = read_document(file_path, process_kwargs)
+            document_id = self.save_document(file_path, sha256, pages)
+
+        return document_id, self.events(document_id)
+
+    def tokens(self, document_id: int, page: int = 0) -> dict:
+        """Returns the OCR boxes of a stored page, as a CalendarReader.ocr_data dict."""
+        data = {"left": [], "top": [], "width": [], "height": [], "text": [], "conf": []}
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT t.left, t.top, t.width, t.height, t.text, t.conf FROM tokens t "
+                "JOIN pages p ON p.id = t.page_id WHERE p.document_id = ? AND p.page = ? ORDER BY t.rowid",
+                (document_id, page)).fetchall()
+        for row in rows:
+            for key, value in zip(data, row):
+                data[key].append(value)
+        return data
+
+    @staticmethod
+    def _event(row) -> tuple:
+        event_id, day, beg, end, name, flag, x, y, w, h = row
+        return event_id, event(name, beg=beg, end=end, box=box(x, y, w, h), flag=flag, day=day)
+
+    def events(self, document_id: int) -> list:
+        """Returns the list of (event id, event) of a document, in page then reading order."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT e.id, e.day, e.beg, e.end, e.name, e.flag, e.x, e.y, e.w, e.h FROM events e "
+                "JOIN pages p ON p.id = e.page_id WHERE p.document_id = ? ORDER BY p.page, e.id",
+                (document_id,)).fetchall()
+        return [self._event(row) for row in rows]
+
+    def events_between(self, first_day: str, last_day: str) -> list:
+        """Returns the (event id, event) of all documents from first_day to last_day (YYYY-MM-DD, included)."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id, day, beg, end, name, flag, x, y, w, h FROM events "
+                "WHERE day BETWEEN ? AND ? ORDER BY day, beg", (first_day, last_day)).fetchall()
+        return [self._event(row) for row in rows]
+
+    def set_flag(self, event_id: int, flag: int):
+        """Saves the checked state of an event (unchecked events are not exported)."""
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE events SET flag = ? WHERE id = ?", (int(flag), event_id))
+
+    # --- Exports ---
+
+    def record_export(self, event_id: int, calendar_id: str, status: str,
+                      google_id: str | None = None, error: str | None = None):
+        """
+        Records an export attempt.
+
+        Parameters:
+        - status: "done", "failed" or "duplicate" (same event already exported from another document)
+        """
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO exports (event_id, calendar_id, status, google_id, attempts, last_error, updated_at) "
+                "VALUES (?, ?, ?, ?, 1, ?, ?) "
+                "ON CONFLICT (event_id, calendar_id) DO UPDATE SET status = excluded.status, "
+                "google_id = COALESCE(excluded.google_id, google_id), attempts = attempts + 1, "
+                "last_error = excluded.last_error, updated_at = excluded.updated_at",
+                (event_id, calendar_id, status, google_id, error, _now()))
+
+    def pending_exports(self, document_id: int, calendar_id: str) -> list:
+        """Returns the (event id, event) of a document that are checked and not yet in the calendar."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT e.id, e.day, e.beg, e.end, e.name, e.flag, e.x, e.y, e.w, e.h FROM events e "
+                "JOIN pages p ON p.id = e.page_id "
+                "LEFT JOIN exports x ON x.event_id = e.id AND x.calendar_id = ? "
+                "WHERE p.document_id = ? AND e.flag = 1 AND (x.status IS NULL OR x.status = 'failed') "
+                "ORDER BY p.page, e.id", (calendar_id, document_id)).fetchall()
+        return [self._event(row) for row in rows]
+
+    def exported_elsewhere(self, e: event, event_id: int, calendar_id: str) -> bool:
+        """True if the same event (day, hours and name) was already exported to the calendar from another scan."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM events e JOIN exports x ON x.event_id = e.id "
+                "WHERE e.day = ? AND e.beg = ? AND e.end = ? AND e.name = ? AND e.id != ? "
+                "AND x.calendar_id = ? AND x.status = 'done' LIMIT 1",
+                (e.day, e.beg, e.end, e.name, event_id, calendar_id)).fetchone()
+        return row is not None
+
+    @staticmethod
+    def google_id(event_id: int, calendar_id: str, sha256: str = "") -> str:
+        """
+        Deterministic Google Calendar event id (lowercase hex is valid base32hex).
+        If a crash happens after the insert but before it is recorded, the retry gets a 409 instead of a copy.
+        """
+        return hashlib.sha1(f"{sha256}|{event_id}|{calendar_id}".encode()).hexdigest()
+
+    def export_pending(self, auth, document_id: int, calendar_id: str | None = None,
+                       skip_duplicates: bool = True) -> list:
+        """
+        Exports the events of a document not yet created in the calendar.
+
+        Parameters:
+        - auth: GoogleAuth instance
+        - document_id: Stored document (see scan)
+        - calendar_id: Target calendar ID. If None, the account of config.ini.
+        - skip_duplicates: do not export the events already exported from another document
+
+        Returns:
+        - List of events that failed to export
+        """
+        if calendar_id is None:
+            calendar_id = auth.google_account
+        with self._lock:
+            sha256 = self.conn.execute("SELECT sha256 FROM documents WHERE id = ?", (document_id,)).fetchone()[0]
+
+        errors = []
+        for event_id, e in self.pending_exports(document_id, calendar_id):
+            if skip_duplicates and self.exported_elsewhere(e, event_id, calendar_id):
+                self.record_export(event_id, calendar_id, "duplicate")
+                continue
+            google_id = self.google_id(event_id, calendar_id, sha256)
+            try:
+                auth.export_event(e, calendar_id, event_id=google_id)
+                self.record_export(event_id, calendar_id, "done", google_id)
+            except HttpError as error:
+                if error.resp.status == 409:  # Created before a crash, not recorded
+                    self.record_export(event_id, calendar_id, "done", google_id)
+                else:
+                    print(f"Failed to create event '{e.name}': {error}")
+                    self.record_export(event_id, calendar_id, "failed", error=str(error))
+                    errors.append(e)
+            except Exception as error:
+                print(f"Failed to create event '{e.name}': {error}")
+                self.record_export(event_id, calendar_id, "failed", error=str(error))
+                errors.append(e)
+        return errors
@@ -0,0 +1,205 @@
+"""
+Shared-memory transport of rendered pages between the main process and OCR / separator worker processes.
+
+Pages are rendered into blocks of multiprocessing.shared_memory taken from a bounded pool. Workers only
+receive a PageBuffer handle (block name, shape, dtype) and read the pixels in place: a 300-DPI page is
+never pickled. A block goes back to the pool once both workers are done with it, and rendering waits for
+a free block, so memory stays bounded whatever the number of pages.
+
+    readers = read_pages("planning.pdf", workers=4)
+    events = [e for reader in readers for e in reader.events]
+"""
+
+import os
+import threading
+import queue
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+import fitz  # PyMuPDF for PDF processing
+from PIL import Image
+
+from calendar_reader import CalendarReader, pixmap_array, load_photo, A4_LONG_SIDE
+from ocr_backend import get_backend
+from profiling import profiler
+
+
+PageBuffer = namedtuple("PageBuffer", ["name", "shape", "dtype"])
+
+
+class BufferPool:
+    """
+    At most max_blocks shared memory blocks of block_size bytes, created on demand and reused.
+    acquire() waits when all blocks are in use.
+    """
+
+    def __init__(self, block_size: int, max_blocks: int):
+        self.block_size = block_size
+        self.max_blocks = max_blocks
+        self._blocks = {}
+        self._free = queue.Queue()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: float | None = None) -> SharedMemory:
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._blocks) < self.max_blocks:
+                shm = SharedMemory(create=True, size=self.block_size)
+                self._blocks[shm.name] = shm
+                return shm
+        return self._free.get(timeout=timeout)
+
+    def release(self, shm: SharedMemory):
+        self._free.put(shm)
+
+    def close(self):
+        """Frees all the blocks. Workers must be done with them."""
+        for shm in self._blocks.values():
+            shm.close()
+            shm.unlink()
+        self._blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+# --- Main process side ---
+
+def page_sizes(file_path: str, pages: list, dpi: int) -> list:
+    """Returns the (height, width) in pixels of the pages rendered at dpi (images: their full size, an upper bound)."""
+    if file_path[-3:].lower() != "pdf":
+        with Image.open(file_path) as img:
+            return [(img.height, img.width)]
+    doc = fitz.open(file_path)
+    try:
+        matrix = fitz.Matrix(dpi / 72, dpi / 72)
+        return [(r.height, r.width) for r in ((doc[n].rect * matrix).irect for n in pages)]
+    finally:
+        doc.close()
+
+
+def render_into(shm: SharedMemory, file_path: str, page: int, dpi: int, doc=None) -> PageBuffer:
+    """
+    Renders a page in grayscale into a shared memory block.
+
+    Parameters:
+    - doc: fitz.Document of file_path, opened once by the caller (PDF files)
+
+    Returns:
+    - Handle of the page pixels
+    """
+    if doc is not None:
+        pix = doc[page].get_pixmap(matrix=fitz.Matrix(dpi / 72, dpi / 72), colorspace=fitz.csGRAY, alpha=False)
+        pixels = pixmap_array(pix)
+    else:
+        pixels = load_photo(file_path, int(A4_LONG_SIDE * dpi))
+
+    handle = PageBuffer(shm.name, pixels.shape, "uint8")
+    np.copyto(np.ndarray(pixels.shape, dtype=np.uint8, buffer=shm.buf), pixels)
+    return handle
+
+
+def _release_when_done(pool: BufferPool, shm: SharedMemory, futures: list):
+    """Gives the block back to the pool when all the futures reading it are finished."""
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def done(_):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            pool.release(shm)
+
+    for future in futures:
+        future.add_done_callback(done)
+
+
+def read_pages(file_path: str, pages: list | None = None, dpi: int = 300, workers: int | None = None,
+               max_blocks: int | None = None, ocr_backend: str | None = None, reocr: bool = True) -> list:
+    """
+    Reads the pages of a planning, OCR and separators running in worker processes on shared memory.
+
+    Parameters:
+    - file_path: Path to the PDF or image file
+    - pages: Page numbers to read. If None, all the pages.
+    - dpi: Resolution used for OCR
+    - workers: Number of worker processes. If None, the number of CPUs.
+    - max_blocks: Number of pages held in shared memory at once. If None, 2 per worker.
+    - ocr_backend: OCR backend name of the workers (see ocr_backend.get_backend)
+    - reocr: see CalendarReader.process
+
+    Returns:
+    - List of CalendarReader, one per page, with their events read (reader.events)
+    """
+    is_pdf = file_path[-3:].lower() == "pdf"
+    doc = fitz.open(file_path) if is_pdf else None
+    try:
+        if pages is None:
+            pages = list(range(len(doc))) if is_pdf else [0]
+        sizes = page_sizes(file_path, pages, dpi)
+        block_size = max(h * w for h, w in sizes)
+
+        workers = workers or os.cpu_count()
+        max_blocks = max_blocks or 2 * workers
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            with BufferPool(block_size, max_blocks) as pool:
+                jobs = []
+                for n in pages:
+                    shm = pool.acquire()
+                    with profiler.stage("shared:render", dpi=dpi) as stage:
+                        handle = render_into(shm, file_path, n, dpi, doc)
+                        stage["pixels"] = handle.shape[0] * handle.shape[1]
+                    ocr = executor.submit(ocr_worker, handle, "full_page", ocr_backend)
+                    separators = executor.submit(separators_worker, handle)
+                    _release_when_done(pool, shm, [ocr, separators])
+                    jobs.append((n, ocr, separators))
+
+                readers = []
+                for n, ocr, separators in jobs:
+                    reader = CalendarReader(file_path, page=n, ocr_backend=ocr_backend)
+                    reader.ocr_dpi = dpi if is_pdf else None
+                    reader.ocr_data = ocr.result()
+                    reader.lines, reader.columns = separators.result()
+                    reader.group_text(reocr=reocr and is_pdf)  # Images have no pixels left to re-read
+                    reader.get_events()
+                    readers.append(reader)
+    finally:
+        if doc is not None:
+            doc.close()
+
+    return readers
+
+
+# --- Worker side ---
+
+_attached = {}
+
+
+def attach(handle: PageBuffer) -> np.ndarray:
+    """
+    Returns the pixels of a handle, without copy. Blocks stay attached to the worker for the next pages.
+    """
+    shm = _attached.get(handle.name)
+    if shm is None:
+        # Workers are children of the main process and share its resource tracker: attaching registers
+        # the block a second time in the same set, and the main process' unlink() unregisters it
+        shm = SharedMemory(name=handle.name)
+        _attached[handle.name] = shm
+    return np.ndarray(handle.shape, dtype=handle.dtype, buffer=shm.buf)
+
+
+def ocr_worker(handle: PageBuffer, profile: str = "full_page", backend: str | None = None) -> dict:
+    return get_backend(backend).read(attach(handle), profile)
+
+
+def separators_worker(handle: PageBuffer) -> tuple:
+    return CalendarReader._find_separators(attach(handle))
@@ -0,0 +1,144 @@
+"""
+Tests of the file-system job queue (job_queue.py), with local worker processes.
+
+    python -m pytest tests/test_job_queue.py
+"""
+
+import os
+import sys
+import time
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from job_queue import JobQueue, Worker, run_worker
+
+
+def make_stale(queue: JobQueue, job: dict):
+    """Ages the heartbeat of a leased job past lease_time."""
+    old = time.time() - queue.lease_time - 1
+    os.utime(queue._path("leased", f"{job['id']}.json"), (old, old))
+
+
+def test_lease_and_complete(tmp_path):
+    queue = JobQueue(str(tmp_path), shards=2)
+    job_id = queue.submit(kind="sleep", seconds=0)
+
+    job = queue.lease("a")
+    assert job["id"] == job_id
+    assert job["attempts"] == 1
+    assert queue.lease("b") is None  # A job is leased once
+    assert queue.heartbeat(job)
+    assert queue.complete(job, {"ok": True})
+    assert queue.counts() == {"pending": 0, "leased": 0, "done": 1, "failed": 0}
+    assert queue.result(job_id)["result"] == {"ok": True}
+
+
+def test_fail_retries_then_fails(tmp_path):
+    queue = JobQueue(str(tmp_path), max_attempts=2, shards=2)
+    job_id = queue.submit(kind="sleep")
+
+    assert queue.fail(queue.lease("a"), "first")
+    assert queue.counts()["pending"] == 1
+    assert queue.fail(queue.lease("a"), "second")
+    assert queue.counts()["failed"] == 1
+    assert queue.result(job_id)["error"] == "second"
+
+
+def test_reap(tmp_path):
+    queue = JobQueue(str(tmp_path), lease_time=10, max_attempts=2, shards=2)
+    job_id = queue.submit(kind="sleep")
+
+    job = queue.lease("a")
+    assert queue.reap() == 0  # Heartbeat still fresh
+    make_stale(queue, job)
+    assert queue.reap() == 1
+    assert queue.counts()["pending"] == 1
+
+    job = queue.lease("b")
+    make_stale(queue, job)
+    assert queue.reap() == 1
+    assert queue.result(job_id)["error"] == "lease expired"
+
+
+def test_lease_of_old_pending_job(tmp_path):
+    queue = JobQueue(str(tmp_path), lease_time=10, shards=2)
+    job_id = queue.submit(kind="sleep")
+    old = time.time() - queue.lease_time - 1
+    os.utime(queue._path(queue._shard(job_id), f"{job_id}.json"), (old, old))
+
+    # Another worker reaps right after the job is moved to leased/, before its lease is written
+    reaper = JobQueue(str(tmp_path), lease_time=10, shards=2)
+    read = queue._read
+    queue._read = lambda path: (reaper.reap(), read(path))[1]
+    job = queue.lease("a")
+    queue._read = read
+
+    assert job["id"] == job_id
+    assert queue.counts() == {"pending": 0, "leased": 1, "done": 0, "failed": 0}
+    assert queue.lease("b") is None
+    assert queue.complete(job, {})
+
+
+def test_stale_owner_cannot_touch_new_lease(tmp_path):
+    queue = JobQueue(str(tmp_path), lease_time=10, shards=2)
+    queue.submit(kind="sleep")
+
+    job_a = queue.lease("a")
+    make_stale(queue, job_a)
+    assert queue.reap() == 1
+    job_b = queue.lease("b")
+    assert job_b["id"] == job_a["id"] and job_b["lease"] != job_a["lease"]
+
+    # The stale owner neither extends, fails nor completes the job leased by b
+    make_stale(queue, job_b)
+    assert not queue.heartbeat(job_a)
+    assert not queue.fail(job_a, "late failure")
+    assert not queue.complete(job_a, {"from": "a"})
+    assert queue.counts() == {"pending": 0, "leased": 1, "done": 0, "failed": 0}
+    leased_path = queue._path("leased", f"{job_b['id']}.json")
+    assert time.time() - os.path.getmtime(leased_path) > queue.lease_time
+
+    assert queue.heartbeat(job_b)
+    assert queue.complete(job_b, {"from": "b"})
+    assert queue.result(job_b["id"])["result"] == {"from": "b"}
+
+
+def test_reap_gives_back_abandoned_claim(tmp_path):
+    queue = JobQueue(str(tmp_path), lease_time=10, shards=2)
+    queue.submit(kind="sleep")
+    job = queue.lease("a")
+
+    # A worker crashed between claiming the job and storing it in done/
+    claimed_path = queue._claim(job["id"], job["lease"])
+    old = int(time.time() - queue.lease_time - 1)
+    os.utime(claimed_path, (old, old))
+    os.replace(claimed_path, queue._path("tmp", f"{job['id']}.{old}.claim"))
+    assert queue.reap() == 1
+    assert queue.counts()["pending"] == 1
+
+
+def test_local_workers(tmp_path):
+    queue = JobQueue(str(tmp_path), lease_time=10, shards=4)
+    job_ids = [queue.submit(kind="sleep", seconds=0.01) for _ in range(20)]
+
+    processes = [multiprocessing.Process(target=run_worker, args=(queue.root, 0.5, 0.05),
+                                         kwargs={"lease_time": 10, "shards": 4}) for _ in range(3)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join(timeout=30)
+        assert p.exitcode == 0
+
+    assert queue.counts() == {"pending": 0, "leased": 0, "done": 20, "failed": 0}
+    assert all(queue.result(job_id)["attempts"] == 1 for job_id in job_ids)
+
+
+def test_worker_failing_handler(tmp_path):
+    queue = JobQueue(str(tmp_path), max_attempts=1, shards=2)
+    job_id = queue.submit(kind="unknown")
+
+    worker = Worker(queue, name="w", poll_interval=0.01)
+    assert worker.run_one()
+    assert not worker.run_one()
+    assert "KeyError" in queue.result(job_id)["error"]
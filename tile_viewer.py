@@ -0,0 +1,211 @@
+"""
+TileViewer widget: zoomable, pannable view of a scanned page with the event boxes on top.
+
+The page is reduced once into a pyramid of half resolutions. At a given zoom, only the 256x256 tiles
+in view are resized from the nearest pyramid level, and kept in an LRU cache: panning and zooming
+never touch the full page. Event boxes are canvas rectangles, so toggling an event only changes a color.
+"""
+
+import math
+from collections import OrderedDict
+from tkinter import Canvas, Frame
+from tkinter.ttk import Scrollbar
+from PIL import Image, ImageTk
+
+
+TILE_SIZE = 256
+
+
+def build_pyramid(img: Image.Image, tile_size: int = TILE_SIZE) -> list:
+    """
+    Halves the image until it fits in one tile.
+
+    Returns:
+    - List of images, level k being 1/2**k of the original size
+    """
+    pyramid = [img]
+    while max(pyramid[-1].size) > tile_size:
+        pyramid.append(pyramid[-1].reduce(2))
+    return pyramid
+
+
+class TileViewer(Frame):
+    """
+    Canvas showing a page at any zoom. Mouse wheel zooms around the cursor, dragging pans.
+    """
+
+    def __init__(self, master, img: Image.Image, cache_size: int = 512, max_zoom: float = 4.0, **kwargs):
+        """
+        Initialize the viewer.
+
+        Parameters:
+        - master: Parent widget
+        - img: Page image (grayscale or RGB), in the pixel coordinates of the event boxes
+        - cache_size: Number of rendered tiles kept in memory
+        - max_zoom: Largest zoom, in screen pixels per page pixel
+        """
+        super().__init__(master, **kwargs)
+        self.pyramid = build_pyramid(img)
+        self.width, self.height = img.size
+        self.cache_size = cache_size
+        self.max_zoom = max_zoom
+        self.zoom = None  # Set to fit the widget on the first <Configure>
+
+        self._cache = OrderedDict()  # (zoom, tx, ty) -> PhotoImage
+        self._items = {}  # (tx, ty) -> canvas item of the current zoom
+        self._boxes = []  # (event, canvas item)
+        self._highlighted = set()  # id() of the events selected in the list
+        self._pending = None
+
+        self.canvas = Canvas(self, bg="white", highlightthickness=0)
+        xbar = Scrollbar(self, orient="horizontal", command=self._xview)
+        ybar = Scrollbar(self, orient="vertical", command=self._yview)
+        self.canvas.configure(xscrollcommand=xbar.set, yscrollcommand=ybar.set)
+        self.canvas.grid(row=0, column=0, sticky="nsew")
+        ybar.grid(row=0, column=1, sticky="ns")
+        xbar.grid(row=1, column=0, sticky="ew")
+        self.rowconfigure(0, weight=1)
+        self.columnconfigure(0, weight=1)
+
+        self.canvas.bind("<Configure>", self._on_configure)
+        self.canvas.bind("<ButtonPress-1>", lambda e: self.canvas.scan_mark(e.x, e.y))
+        self.canvas.bind("<B1-Motion>", self._on_drag)
+        self.canvas.bind("<MouseWheel>", lambda e: self._on_wheel(e, e.delta > 0))
+        self.canvas.bind("<Button-4>", lambda e: self._on_wheel(e, True))  # Linux wheel
+        self.canvas.bind("<Button-5>", lambda e: self._on_wheel(e, False))
+
+    # --- Tiles ---
+
+    def _level(self, zoom: float) -> int:
+        """Smallest pyramid level with at least one level pixel per screen pixel."""
+        if zoom >= 1:
+            return 0
+        return min(int(math.floor(math.log2(1 / zoom))), len(self.pyramid) - 1)
+
+    def _tile(self, tx: int, ty: int) -> ImageTk.PhotoImage:
+        key = (self.zoom, tx, ty)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        level = self._level(self.zoom)
+        src = self.pyramid[level]
+        scale = self.zoom * 2 ** level  # Screen pixels per level pixel
+        w = min(TILE_SIZE, self._display_size()[0] - tx * TILE_SIZE)
+        h = min(TILE_SIZE, self._display_size()[1] - ty * TILE_SIZE)
+        box = (tx * TILE_SIZE / scale, ty * TILE_SIZE / scale,
+               min((tx * TILE_SIZE + w) / scale, src.width), min((ty * TILE_SIZE + h) / scale, src.height))
+        tile = ImageTk.PhotoImage(src.resize((w, h), Image.BILINEAR, box=box))
+
+        self._cache[key] = tile
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return tile
+
+    def _display_size(self) -> tuple:
+        return max(1, int(self.width * self.zoom)), max(1, int(self.height * self.zoom))
+
+    def _update_tiles(self):
+        """Draws the tiles in view and removes the others from the canvas."""
+        self._pending = None
+        if self.zoom is None:
+            return
+        dw, dh = self._display_size()
+        x0, y0 = self.canvas.canvasx(0), self.canvas.canvasy(0)
+        x1, y1 = x0 + self.canvas.winfo_width(), y0 + self.canvas.winfo_height()
+        tx_range = range(max(0, int(x0 // TILE_SIZE)), min(math.ceil(dw / TILE_SIZE), int(x1 // TILE_SIZE) + 1))
+        ty_range = range(max(0, int(y0 // TILE_SIZE)), min(math.ceil(dh / TILE_SIZE), int(y1 // TILE_SIZE) + 1))
+        visible = {(tx, ty) for tx in tx_range for ty in ty_range}
+
+        for key in list(self._items):
+            if key not in visible:
+                self.canvas.delete(self._items.pop(key))
+        for tx, ty in visible:
+            if (tx, ty) not in self._items:
+                self._items[(tx, ty)] = self.canvas.create_image(
+                    tx * TILE_SIZE, ty * TILE_SIZE, image=self._tile(tx, ty), anchor="nw", tags="tile")
+        self.canvas.tag_raise("box")
+
+    def _schedule_update(self):
+        """Coalesces the redraws of a burst of scroll events into one."""
+        if self._pending is None:
+            self._pending = self.after_idle(self._update_tiles)
+
+    # --- Zoom and pan ---
+
+    def set_zoom(self, zoom: float, anchor: tuple | None = None):
+        """
+        Zooms, keeping the page point under anchor (widget coordinates, default center) in place.
+        """
+        fit = self._fit_zoom()
+        zoom = min(max(zoom, min(fit, 1.0)), self.max_zoom)
+        if anchor is None:
+            anchor = (self.canvas.winfo_width() / 2, self.canvas.winfo_height() / 2)
+        old = self.zoom or 1.0  # Boxes drawn before the first zoom are at scale 1
+        px = (self.canvas.canvasx(anchor[0])) / old
+        py = (self.canvas.canvasy(anchor[1])) / old
+
+        self.zoom = zoom
+        for item in self._items.values():
+            self.canvas.delete(item)
+        self._items = {}
+        dw, dh = self._display_size()
+        self.canvas.configure(scrollregion=(0, 0, dw, dh))
+        self.canvas.scale("box", 0, 0, zoom / old, zoom / old)
+        self.canvas.xview_moveto(max(0.0, (px * zoom - anchor[0]) / dw))
+        self.canvas.yview_moveto(max(0.0, (py * zoom - anchor[1]) / dh))
+        self._update_tiles()
+
+    def _fit_zoom(self) -> float:
+        return min(max(self.canvas.winfo_width(), 1) / self.width, max(self.canvas.winfo_height(), 1) / self.height)
+
+    def _on_configure(self, _):
+        if self.zoom is None:
+            self.set_zoom(self._fit_zoom(), anchor=(0, 0))
+        else:
+            self._schedule_update()
+
+    def _on_wheel(self, e, zoom_in: bool):
+        self.set_zoom(self.zoom * (1.25 if zoom_in else 0.8), anchor=(e.x, e.y))
+
+    def _on_drag(self, e):
+        self.canvas.scan_dragto(e.x, e.y, gain=1)
+        self._schedule_update()
+
+    def _xview(self, *args):
+        self.canvas.xview(*args)
+        self._schedule_update()
+
+    def _yview(self, *args):
+        self.canvas.yview(*args)
+        self._schedule_update()
+
+    # --- Event boxes ---
+
+    def set_events(self, events_array):
+        """Draws the boxes of the events, replacing the previous ones."""
+        self.canvas.delete("box")
+        zoom = self.zoom or 1.0
+        self._boxes = []
+        for e in events_array:
+            x, y, w, h = e.box.to_draw()
+            item = self.canvas.create_rectangle(x * zoom, y * zoom, (x + w) * zoom, (y + h) * zoom,
+                                                width=2, tags="box")
+            self._boxes.append((e, item))
+        self.refresh_events()
+
+    def refresh_events(self):
+        """
+        Updates the boxes after events were checked, unchecked or edited: green for 1, red for 0,
+        thicker for the highlighted events.
+        """
+        for e, item in self._boxes:
+            highlighted = id(e) in self._highlighted
+            self.canvas.itemconfigure(item, outline='green' if e.flag else 'red', width=4 if highlighted else 2)
+            if highlighted:
+                self.canvas.tag_raise(item)
+
+    def highlight(self, events):
+        """Highlights the boxes of the given events (e.g. the rows selected in the list), replacing the previous ones."""
+        self._highlighted = {id(e) for e in events}
+        self.refresh_events()
@@ -0,0 +1,255 @@
+"""
+Tuning of the reading settings (OCR dpi, page OCR profile, grouping thresholds) against annotated plannings.
+
+    python tuner.py verite.json --save service_hdj
+
+The ground truth is a JSON list of plannings, paths relative to the JSON file:
+
+    [{"file": "tests/test.pdf", "page": 0,
+      "events": [{"day": "2025-03-10", "beg": "09:00", "end": "09:45", "name": "Kiné"}, ...]}]
+
+Each (planning, dpi, profile) is read once per worker process; every threshold combination is then
+evaluated on that same OCR output, since grouping is cheap next to OCR. The boxes read again (see
+CalendarReader._reocr_weak_boxes) are also read once, and shared by the combinations that group them the same
+way. Pages with a table are grouped by cell, which does not use the thresholds: they are evaluated once, and
+when no planning uses the thresholds the default ones are reported. The Pareto front of mean F1
+against seconds per page is printed, and the chosen settings (the most accurate, or the most accurate
+within --max-seconds) can be saved as a layout profile of layouts.ini, loaded by CalendarReader(layout=name).
+"""
+
+import os
+import json
+import time
+import argparse
+import itertools
+import unicodedata
+from difflib import SequenceMatcher
+from concurrent.futures import ProcessPoolExecutor
+
+from calendar_reader import CalendarReader, DEFAULT_LAYOUT, save_layout_profile
+from profiling import Profiler
+
+
+THRESHOLD_KEYS = ["line_x_threshold", "line_y_threshold", "box_x_threshold", "box_y_threshold"]
+
+
+def _normalize(name: str) -> str:
+    name = unicodedata.normalize("NFKD", name.lower()).encode("ascii", "ignore").decode()
+    return " ".join(name.split())
+
+
+def score(found: list, expected: list, min_name_ratio: float = 0.8) -> float:
+    """
+    F1 score of the events read against the expected ones. An event is correct if its day and times are
+    the expected ones and its name is close enough (difflib ratio, accents and case ignored).
+
+    Parameters:
+    - found: event objects read
+    - expected: dicts with keys day, beg, end, name
+    """
+    if not found and not expected:
+        return 1.0
+    remaining = [(e["day"], e["beg"], e["end"], _normalize(e["name"])) for e in expected]
+    matched = 0
+    for e in found:
+        name = _normalize(e.name)
+        for k, (day, beg, end, expected_name) in enumerate(remaining):
+            if (e.day, e.beg, e.end) == (day, beg, end) and \
+                    SequenceMatcher(None, name, expected_name).ratio() >= min_name_ratio:
+                matched += 1
+                del remaining[k]
+                break
+    if matched == 0:
+        return 0.0
+    precision = matched / len(found)
+    recall = matched / len(expected)
+    return 2 * precision * recall / (precision + recall)
+
+
+class _TuningReader(CalendarReader):
+    """
+    CalendarReader keeping the new readings of the grouped boxes (see _reocr_weak_boxes and _reread_headers),
+    by box and OCR stage: threshold combinations that group a box the same way do not render nor read it again.
+    The time of a reading is charged to every combination that uses it, so that the seconds stay comparable.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._crops = {}     # box -> (crop, seconds)
+        self._readings = {}  # (box, stage) -> (OCR data, seconds)
+        self._box = None
+        self.charged = 0.0   # Seconds of the readings used, cached or not
+        self.spent = 0.0     # Seconds actually spent on the readings
+
+    def _crop_box(self, data: dict, i: int, dpi: int):
+        self._box = (data["left"][i], data["top"][i], data["width"][i], data["height"][i], dpi)
+        if self._box not in self._crops:
+            start = time.perf_counter()
+            crop = super()._crop_box(data, i, dpi)
+            self._crops[self._box] = (crop, time.perf_counter() - start)
+            self.spent += self._crops[self._box][1]
+        crop, seconds = self._crops[self._box]
+        self.charged += seconds
+        return crop
+
+    def _ocr(self, image, stage: str) -> dict:
+        if stage not in ("reocr", "headers"):
+            return super()._ocr(image, stage)
+        key = (self._box, stage)
+        if key not in self._readings:
+            start = time.perf_counter()
+            data = super()._ocr(image, stage)
+            self._readings[key] = (data, time.perf_counter() - start)
+            self.spent += self._readings[key][1]
+        data, seconds = self._readings[key]
+        self.charged += seconds
+        return data
+
+
+def evaluate(planning: dict, dpi: int, profile: str, thresholds: list, reocr: bool = True,
+             ocr_backend: str | None = None) -> list:
+    """
+    Reads a planning at dpi with the page profile, then groups the words with every threshold combination.
+
+    Parameters:
+    - planning: ground truth entry, with an absolute "file"
+    - thresholds: list of dicts of THRESHOLD_KEYS
+
+    Returns:
+    - List of (thresholds, F1, seconds), one per threshold combination. The seconds include the OCR.
+      A page with a table is grouped by cell, without the thresholds: a single (None, F1, seconds) is returned.
+    """
+    # keep_image: photos are re-read from the pixels by every threshold combination (see _crop_box)
+    reader = _TuningReader(planning["file"], page=planning.get("page", 0), profiler=Profiler(enabled=False),
+                           ocr_backend=ocr_backend, layout={"ocr_dpi": dpi, "page_profile": profile},
+                           keep_image=True)
+    start = time.perf_counter()
+    reader.load_image(dpi=dpi)
+    reader.get_separators()
+    ocr_data = reader.extract_text()
+    read_time = time.perf_counter() - start
+    if len(reader.lines) > 0 and len(reader.columns) > 0:
+        thresholds = [None]  # Same test as group_text: _group_cells
+
+    results = []
+    for combination in thresholds:
+        if combination is not None:
+            reader.layout.update(combination)
+        reader.ocr_data = {k: list(v) for k, v in ocr_data.items()}
+        charged, spent = reader.charged, reader.spent
+        start = time.perf_counter()
+        reader.group_text(reocr)
+        events = reader.get_events()
+        seconds = time.perf_counter() - start - (reader.spent - spent) + (reader.charged - charged)
+        results.append((combination, score(list(events), planning["events"]), read_time + seconds))
+    reader.close()
+    return results
+
+
+def pareto_front(results: list) -> list:
+    """
+    Keeps the settings that no other setting beats in both accuracy and time.
+
+    Parameters:
+    - results: dicts with keys "f1" and "seconds"
+
+    Returns:
+    - The front, from the fastest to the most accurate
+    """
+    front = []
+    for r in sorted(results, key=lambda r: (r["seconds"], -r["f1"])):
+        if not front or r["f1"] > front[-1]["f1"]:
+            front.append(r)
+    return front
+
+
+def tune(truth_path: str, dpis: list, profiles: list, thresholds: dict, reocr: bool = True,
+         workers: int | None = None, ocr_backend: str | None = None) -> list:
+    """
+    Grid search of the settings over the plannings of a ground truth file.
+
+    Parameters:
+    - truth_path: ground truth JSON file (see module docstring)
+    - dpis, profiles: OCR resolutions and page OCR profiles tried
+    - thresholds: dict THRESHOLD_KEYS -> list of values tried
+    - workers: Number of worker processes. If None, the number of CPUs.
+
+    Returns:
+    - List of dicts: the layout settings, with "f1" (mean over the plannings) and "seconds" (mean per page)
+    """
+    with open(truth_path, encoding="utf-8") as f:
+        plannings = json.load(f)
+    root = os.path.dirname(os.path.abspath(truth_path))
+    for p in plannings:
+        p["file"] = os.path.join(root, p["file"])
+
+    combinations = [dict(zip(THRESHOLD_KEYS, values))
+                    for values in itertools.product(*(thresholds[k] for k in THRESHOLD_KEYS))]
+
+    totals = {}  # (dpi, profile) -> {threshold values, or None for the pages with a table: [F1, seconds]}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(evaluate, p, dpi, profile, combinations, reocr, ocr_backend): (dpi, profile)
+                   for p in plannings for dpi in dpis for profile in profiles}
+        for future, (dpi, profile) in futures.items():
+            for combination, f1, seconds in future.result():
+                values = None if combination is None else tuple(combination[k] for k in THRESHOLD_KEYS)
+                total = totals.setdefault((dpi, profile), {}).setdefault(values, [0.0, 0.0])
+                total[0] += f1
+                total[1] += seconds
+
+    results = []
+    for (dpi, profile), by_values in totals.items():
+        tables = by_values.pop(None, [0.0, 0.0])
+        if not by_values:
+            # Only tables: the thresholds are not used, report the default ones
+            by_values = {tuple(DEFAULT_LAYOUT[k] for k in THRESHOLD_KEYS): [0.0, 0.0]}
+        for values, (f1, seconds) in by_values.items():
+            results.append({"ocr_dpi": dpi, "page_profile": profile, **dict(zip(THRESHOLD_KEYS, values)),
+                            "f1": (f1 + tables[0]) / len(plannings),
+                            "seconds": (seconds + tables[1]) / len(plannings)})
+    return results
+
+
+def _values(text: str) -> list:
+    return [int(v) for v in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recherche des réglages de lecture sur des plannings annotés.")
+    parser.add_argument("truth", help="Fichier JSON des événements attendus")
+    parser.add_argument("--dpi", type=_values, default=[150, 200, 250, 300])
+    parser.add_argument("--profiles", default="full_page,event_cells", help="Profils OCR de la page entière")
+    parser.add_argument("--line-x", type=_values, default=[200, 300, 400])
+    parser.add_argument("--line-y", type=_values, default=[35, 50, 70])
+    parser.add_argument("--box-x", type=_values, default=[100, 150, 200])
+    parser.add_argument("--box-y", type=_values, default=[50, 75, 100])
+    parser.add_argument("--no-reocr", action="store_true", help="Ne pas relire les cases mal lues")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--ocr-backend", default=None, help="tesserocr, pytesseract ou auto")
+    parser.add_argument("--max-seconds", type=float, default=None, help="Temps par page maximal du réglage choisi")
+    parser.add_argument("--save", default=None, help="Nom du profil enregistré dans layouts.ini")
+    args = parser.parse_args()
+
+    thresholds = dict(zip(THRESHOLD_KEYS, [args.line_x, args.line_y, args.box_x, args.box_y]))
+    results = tune(args.truth, args.dpi, args.profiles.split(","), thresholds, not args.no_reocr,
+                   args.workers, args.ocr_backend)
+
+    front = pareto_front(results)
+    print(f"{'F1':>6} {'s/page':>7} {'dpi':>4} {'profil':<12} " + " ".join(f"{k[:-10]:>7}" for k in THRESHOLD_KEYS))
+    for r in front:
+        print(f"{r['f1']:6.3f} {r['seconds']:7.2f} {r['ocr_dpi']:>4} {r['page_profile']:<12} "
+              + " ".join(f"{r[k]:>7}" for k in THRESHOLD_KEYS))
+
+    candidates = [r for r in front if args.max_seconds is None or r["seconds"] <= args.max_seconds]
+    if not candidates:
+        print(f"Aucun réglage ne lit une page en moins de {args.max_seconds} s")
+        return
+    chosen = candidates[-1]
+    print(f"Réglage choisi : F1 {chosen['f1']:.3f}, {chosen['seconds']:.2f} s/page")
+    if args.save:
+        save_layout_profile(args.save, {k: chosen[k] for k in DEFAULT_LAYOUT})
+        print(f"Profil {args.save!r} enregistré, à utiliser avec CalendarReader(fichier, layout={args.save!r})")
+
+
+if __name__ == '__main__':
+    main()
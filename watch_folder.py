@@ -0,0 +1,275 @@
+"""
+Watch-folder service: scans the plannings dropped in a directory and exports them to Google Calendar.
+
+    python watch_folder.py "D:/Plannings" --calendar <calendar id> --workers 2
+
+Processed files are recorded in a journal (JSON lines) so that a restart does not export them twice.
+Files that failed, or whose export failed for some events, are retried with an exponential backoff:
+only the events that failed are exported again. With --store, scans and exports are also kept in a SQLite
+database (see scan_store.py): a file already scanned is not read again, and the export of a file
+interrupted by a crash resumes with the missing events.
+"""
+
+import os
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from calendar_reader import CalendarReader
+from google_auth import GoogleAuth
+from credential_broker import CredentialBroker
+from scan_store import ScanStore
+from event import event
+
+
+SUPPORTED_EXTENSIONS = (".pdf", ".png", ".jpg")
+
+
+def _read_file(path: str) -> list:
+    """Reads a planning in a reader process (PyMuPDF is not thread-safe). Returns the events as dicts."""
+    with CalendarReader(path) as reader:
+        return [e.to_dict() for e in reader.get_events()]
+
+
+class Journal:
+    """
+    Append-only JSON lines file of the processed files.
+    A file is identified by its path, size and modification time, so a modified file is processed again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Last line cut by a crash
+                    self.entries[entry["key"]] = entry
+
+    @staticmethod
+    def key(path: str, stat: os.stat_result) -> str:
+        return f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries
+
+    def get(self, key: str) -> dict | None:
+        return self.entries.get(key)
+
+    def record(self, key: str, status: str, **fields):
+        """Appends an entry and flushes it to disk before returning."""
+        entry = {"key": key, "status": status, "time": time.strftime("%Y-%m-%dT%H:%M:%S"), **fields}
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.entries[key] = entry
+
+
+class WatchFolder:
+    """
+    Polls a directory and processes every new planning with CalendarReader, then exports it with GoogleAuth.
+    At most max_pending files are queued or running at once: the others wait on disk for a later poll.
+    Files are read in worker processes, since PyMuPDF cannot render in several threads at once;
+    the exports run in threads.
+    """
+
+    def __init__(self, directory: str, calendar_id: str | None = None, workers: int = 2, max_pending: int = 8,
+                 poll_interval: float = 2.0, settle_time: float = 5.0, journal_path: str | None = None,
+                 broker: CredentialBroker | None = None, store: ScanStore | None = None,
+                 max_retries: int = 5, retry_delay: float = 60.0):
+        """
+        Initialize the service.
+
+        Parameters:
+        - directory: Folder to watch
+        - calendar_id: Target calendar ID. If None, the account of config.ini.
+        - workers: Number of files processed in parallel (reader processes and export threads)
+        - max_pending: Maximum number of files queued or running (backpressure)
+        - poll_interval: Seconds between two scans of the folder
+        - settle_time: Seconds a file must keep the same size and date before being read (files being copied)
+        - journal_path: Journal file. If None, .scan_journal.jsonl in the watched folder.
+        - broker: CredentialBroker shared by the workers. If None, one is created on token.json.
+        - store: ScanStore keeping the scans and export outcomes. If None, nothing is stored.
+        - max_retries: Number of new attempts for a file that failed or was partially exported
+        - retry_delay: Seconds before the first new attempt, doubled at each attempt
+        """
+        self.directory = directory
+        self.calendar_id = calendar_id
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        if journal_path is None:
+            journal_path = os.path.join(directory, ".scan_journal.jsonl")
+        self.journal = Journal(journal_path)
+        self.broker = broker if broker is not None else CredentialBroker(scopes=GoogleAuth.SCOPES)
+        self.store = store
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan")
+        self._readers = ProcessPoolExecutor(max_workers=workers)
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._in_flight = set()
+        self._candidates = {}  # path -> (size, mtime_ns, stable since)
+        self._local = threading.local()
+        self._stop = threading.Event()
+
+    def _auth(self) -> GoogleAuth:
+        """One Google client per worker thread, all sharing the broker's token."""
+        auth = getattr(self._local, "auth", None)
+        if auth is None:
+            auth = GoogleAuth(broker=self.broker).setup()
+            self._local.auth = auth
+        return auth
+
+    def _retry_due(self, entry: dict) -> bool:
+        """True if a file that failed or was partially exported must be attempted again now."""
+        return (entry["status"] in ("failed", "partial") and entry.get("attempts", 1) <= self.max_retries
+                and time.time() >= entry.get("retry_at", 0))
+
+    def _ready_files(self) -> list:
+        """Lists the new files whose size and date did not change for settle_time seconds, and the retries due."""
+        now = time.monotonic()
+        ready = []
+        present = set()
+
+        for entry in os.scandir(self.directory):
+            if not entry.is_file() or not entry.name.lower().endswith(SUPPORTED_EXTENSIONS):
+                continue
+            stat = entry.stat()
+            key = Journal.key(entry.path, stat)
+            if key in self._in_flight:
+                continue
+            if key in self.journal:
+                if self._retry_due(self.journal.get(key)):
+                    ready.append((entry.path, key))
+                continue
+
+            present.add(entry.path)
+            size, mtime, since = self._candidates.get(entry.path, (None, None, now))
+            if (size, mtime) != (stat.st_size, stat.st_mtime_ns):
+                since = now
+            self._candidates[entry.path] = (stat.st_size, stat.st_mtime_ns, since)
+            if now - since >= self.settle_time:
+                ready.append((entry.path, key))
+
+        # Forget the files that were removed
+        for path in list(self._candidates):
+            if path not in present:
+                del self._candidates[path]
+
+        return sorted(ready)
+
+    def poll_once(self) -> int:
+        """
+        Queues the ready files, as long as there are free slots.
+
+        Returns:
+        - Number of files queued
+        """
+        queued = 0
+        for path, key in self._ready_files():
+            if not self._slots.acquire(blocking=False):
+                break  # Backpressure: the remaining files wait for the next poll
+            self._in_flight.add(key)
+            self._candidates.pop(path, None)
+            self._pool.submit(self._process, path, key)
+            queued += 1
+        return queued
+
+    def _retry_fields(self, attempts: int, path: str) -> dict:
+        """Journal fields of a file to attempt again later, with an exponential backoff."""
+        if attempts > self.max_retries:
+            print(f"{os.path.basename(path)}: abandon après {attempts} tentatives")
+        return {"attempts": attempts, "retry_at": time.time() + self.retry_delay * 2 ** (attempts - 1)}
+
+    def _process(self, path: str, key: str):
+        previous = self.journal.get(key)
+        attempts = previous.get("attempts", 1) + 1 if previous else 1
+        try:
+            if self.store is not None:
+                # The store only exports the events not created yet
+                document_id, stored = self.store.scan(path, executor=self._readers)
+                events = [e for _, e in stored]
+                errors = self.store.export_pending(self._auth(), document_id, self.calendar_id)
+            elif previous is not None and previous["status"] == "partial":
+                # Only the events that failed the previous time
+                events = [event.from_dict(d) for d in previous["failed_events"]]
+                errors = self._auth().export_events(events, self.calendar_id)
+            else:
+                events = [event.from_dict(d) for d in self._readers.submit(_read_file, path).result()]
+                errors = self._auth().export_events(events, self.calendar_id)
+
+            if len(errors) == 0:
+                self.journal.record(key, "done", events=len(events), attempts=attempts)
+            else:
+                self.journal.record(key, "partial", events=len(events),
+                                    errors=[f"{e.day} {e.beg} {e.name}" for e in errors],
+                                    failed_events=[e.to_dict() for e in errors],
+                                    **self._retry_fields(attempts, path))
+            print(f"{os.path.basename(path)}: {len(events)} événements, {len(errors)} erreurs")
+        except Exception as e:
+            fields = self._retry_fields(attempts, path)
+            if previous is not None and previous["status"] == "partial":
+                # Keep the events still to export for the next attempt
+                self.journal.record(key, "partial", error=repr(e), errors=previous["errors"],
+                                    failed_events=previous["failed_events"], **fields)
+            else:
+                self.journal.record(key, "failed", error=repr(e), **fields)
+            print(f"{os.path.basename(path)}: échec ({e})")
+        finally:
+            self._in_flight.discard(key)
+            self._slots.release()
+
+    def run_forever(self):
+        """Polls the folder until stop() is called."""
+        # Log in once before starting the workers
+        self._auth()
+        self.broker.start()
+        try:
+            while not self._stop.is_set():
+                self.poll_once()
+                self._stop.wait(self.poll_interval)
+        finally:
+            self._pool.shutdown(wait=True)
+            self._readers.shutdown(wait=True)
+            self.broker.stop()
+
+    def stop(self):
+        self._stop.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scanne et exporte les plannings déposés dans un dossier.")
+    parser.add_argument("directory", help="Dossier surveillé")
+    parser.add_argument("--calendar", default=None, help="Identifiant du calendrier cible")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--max-pending", type=int, default=8)
+    parser.add_argument("--poll", type=float, default=2.0, help="Secondes entre deux scans du dossier")
+    parser.add_argument("--settle", type=float, default=5.0, help="Secondes sans modification avant lecture")
+    parser.add_argument("--journal", default=None)
+    parser.add_argument("--store", default=None, help="Base SQLite des scans et exports (ex: scan_store.db)")
+    parser.add_argument("--retries", type=int, default=5, help="Nouvelles tentatives après un échec")
+    parser.add_argument("--retry-delay", type=float, default=60.0, help="Secondes avant la première nouvelle tentative")
+    args = parser.parse_args()
+
+    service = WatchFolder(args.directory, calendar_id=args.calendar, workers=args.workers,
+                          max_pending=args.max_pending, poll_interval=args.poll,
+                          settle_time=args.settle, journal_path=args.journal,
+                          store=ScanStore(args.store) if args.store else None,
+                          max_retries=args.retries, retry_delay=args.retry_delay)
+    try:
+        service.run_forever()
+    except KeyboardInterrupt:
+        service.stop()
+
+
+if __name__ == '__main__':
+    main()